@@ -1,6 +1,10 @@
+import asyncio
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Sequence
+
+from .http import SessionManager
+from .ratelimit import RateLimiter
 
 ONE_DAY = 86400
 
@@ -14,6 +18,13 @@ class Translation:
 
 class BaseProvider(ABC):
     icon = ""
+    max_characters: Optional[int] = None  # Maximum characters of a single text, longer texts are split up
+    max_batch_size = 1  # Maximum amount of texts in one translate request
+    max_batch_characters: Optional[int] = None  # Maximum amount of characters in one translate request
+    detects_inline = False  # Whether translate sets Translation.source to the detected language when not given one
+    throttles_requests = False  # Whether the provider calls throttle() itself, AsyncTranslate does it otherwise
+    rate_limiter: Optional[RateLimiter] = None
+    session_manager: Optional[SessionManager] = None  # Shared HTTP pool, set by AsyncTranslate.add_provider
 
     @property
     def name(self) -> str:
@@ -32,5 +43,30 @@ class BaseProvider(ABC):
     async def translate(self, content: str, to: str, source="", **options) -> Translation:
         raise NotImplementedError
 
+    async def translate_batch(self, contents: Sequence[str], to: str, source="", **options) -> List[Translation]:
+        """
+        Translates multiple texts, returning the translations in the same order
+        Providers that can send several texts in one request should override this and set max_batch_size
+        """
+        return list(await asyncio.gather(*(self.translate(content, to=to, source=source, **options)
+                                           for content in contents)))
+
+    def set_rate_limit(self, requests_per_second: Optional[float] = None,
+                       characters_per_second: Optional[float] = None, burst: float = 1.0):
+        """Limit the requests and characters per second sent by this provider, None removes the limit"""
+        if requests_per_second or characters_per_second:
+            self.rate_limiter = RateLimiter(requests_per_second, characters_per_second, burst)
+        else:
+            self.rate_limiter = None
+
+    async def throttle(self, characters: int = 0):
+        """
+        Wait for the rate limiter before sending a request
+        AsyncTranslate calls this before each of its calls unless the provider sets throttles_requests, for providers
+        that throttle every HTTP request themselves (including retries) or are used on their own.
+        """
+        if self.rate_limiter:
+            await self.rate_limiter.acquire(characters)
+
     async def close(self):
         pass
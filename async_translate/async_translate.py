@@ -1,16 +1,96 @@
-from functools import cached_property
+import asyncio
+import os
+import time
+from collections import Counter, deque
+from dataclasses import replace
+from functools import cached_property, partial
 from types import MappingProxyType
-from typing import Optional, Dict, Set, Mapping
-from .caseinsensitivedict import CaseInsensitiveDict
+from typing import Optional, Dict, Set, Mapping, Sequence, List, Callable, AsyncIterable, AsyncIterator, Iterable, \
+    Union, Deque, Hashable, FrozenSet
+from . import serializers
 from .abc import BaseProvider, Translation
+from .batching import batch_ranges
+from .cache import CacheBackend, TranslationCache
+from .chunking import split_text, strip_chunk
+from .circuitbreaker import CircuitBreaker
+from .coalescer import Coalescer
+from .detection import LocalDetector, DetectionCache
+from .http import SessionManager
+from .retry import deadline_scope, within_deadline
+from .routing import Router
+from .quota import QuotaLedger, Reservation
+from .registry import LanguageIndex, LanguageRegistry
+from .trivial import is_untranslatable, mask
+from .singleflight import SingleFlight
+from .utils import freeze_options
 from .errors import *
 
 
+async def _aiter(contents: Union[AsyncIterable[str], Iterable[str]]) -> AsyncIterator[str]:
+    if isinstance(contents, AsyncIterable):
+        async for content in contents:
+            yield content
+    else:
+        for content in contents:
+            yield content
+
+
 class AsyncTranslate:
-    def __init__(self):
+    HEDGE_MIN_SAMPLES = 20  # Latencies measured before hedge_percentile is used
+    SNAPSHOT_VERSION = 1  # Format of save_languages files
+
+    def __init__(self, *, coalesce_delay: Optional[float] = None, inline_detection: bool = False,
+                 concurrent_detection: bool = False, cache: Optional[CacheBackend] = None,
+                 single_flight: bool = True,
+                 circuit_breaker: Optional[Callable[[], CircuitBreaker]] = CircuitBreaker,
+                 session_manager: Optional[SessionManager] = None, local_detector: Optional[LocalDetector] = None,
+                 detection_cache: Optional[DetectionCache] = None, skip_untranslatable: bool = False,
+                 mask_untranslatable: bool = False, quota: Optional[QuotaLedger] = None,
+                 language_refresh_interval: Optional[float] = None):
+        """
+        :param coalesce_delay: Optional seconds to hold translate calls for, so concurrent calls to the same provider
+        and language are merged into one batched request. Disabled when None.
+        :param inline_detection: Translate first and use the language the provider detected alongside the translation,
+        instead of a separate detect request. Only used with providers that set detects_inline.
+        :param concurrent_detection: Run detect and translate at the same time, for providers that can't detect inline
+        :param cache: Optional cache backend, such as LRUCache, for translate and detect results
+        :param single_flight: Share one provider call between identical concurrent translate and detect calls
+        :param circuit_breaker: Optional factory creating each provider's CircuitBreaker, None disables them.
+        While a provider's breaker is open, translations fail over to another provider supporting the language.
+        :param session_manager: Optional HTTP connection pool lent to the providers, pass the same one to several
+        instances to share it between them. A default pool is created and closed by this instance otherwise.
+        :param local_detector: Optional detector, such as ScriptDetector, tried before the provider's detect. Its result
+        is used without any request when confident enough and supported by the provider.
+        :param detection_cache: Optional cache of detected languages, also filled by languages detected inline
+        :param skip_untranslatable: Return content with nothing to translate (emoji, URLs, mentions, numbers, code)
+        as is, without any request
+        :param mask_untranslatable: Swap URLs, mentions, custom emoji and code for placeholders before translating,
+        putting them back in the translation
+        :param quota: Optional ledger of characters left per tenant, charged by translate calls given a tenant
+        :param language_refresh_interval: Optional seconds between fetching every provider's languages again,
+        started once a provider is added
+        """
+        self.quota = quota
+        self.skip_untranslatable = skip_untranslatable
+        self.mask_untranslatable = mask_untranslatable
+        self.detection_cache = detection_cache
+        self.local_detector = local_detector
+        self._owns_session_manager = session_manager is None
+        self.session_manager = session_manager if session_manager is not None else SessionManager()
+        self.router = Router()
+        self._circuit_breaker = circuit_breaker
+        self._breakers: Dict[str, CircuitBreaker] = {}  # {'provider_name': CircuitBreaker() }
+        self._in_flight: Optional[SingleFlight] = SingleFlight() if single_flight else None
+        self.cache: Optional[TranslationCache] = TranslationCache(cache) if cache is not None else None
+        self.inline_detection = inline_detection
+        self.concurrent_detection = concurrent_detection
+        self._coalescer: Optional[Coalescer] = Coalescer(coalesce_delay) if coalesce_delay is not None else None
         self._providers: Dict[str, BaseProvider] = {}  # {'provider_name': ProviderInstance() }
-        self._languages: Dict[str, Set[str]] = {}  # {'language_name': {'provider_name'} }
-        self._language_names: Dict[str, str] = {}  # {'en': 'English'}
+        self._registry = LanguageRegistry({}, {}, ())
+        self._snapshot: Dict[str, Dict[str, str]] = {}  # Loaded languages of providers not added yet
+        self._language_fetches: Set[asyncio.Future] = set()  # get_languages running in the background
+        self.language_refresh_interval = language_refresh_interval
+        self._refresher: Optional[asyncio.Task] = None
 
     @property
     def providers(self) -> Mapping[str, BaseProvider]:
@@ -18,18 +98,29 @@ class AsyncTranslate:
         return MappingProxyType(self._providers)
 
     @property
-    def languages(self) -> Mapping[str, Set[str]]:
+    def breakers(self) -> Mapping[str, CircuitBreaker]:
+        """Returns read-only copy of the circuit breakers of each provider"""
+        return MappingProxyType(self._breakers)
+
+    @property
+    def languages(self) -> Mapping[str, FrozenSet[str]]:
         """Returns read-only copy of the languages"""
-        return MappingProxyType(self._languages)
+        return self._registry.languages
 
     @property
     def language_names(self) -> Mapping[str, str]:
-        return CaseInsensitiveDict(self._language_names)
+        """Returns read-only, case-insensitive language names by code"""
+        return self._registry.index.names
 
-    @cached_property
+    @property
     def language_by_names(self) -> Mapping[str, str]:
         """Returns read-only copy of language codes with their English names"""
-        return CaseInsensitiveDict({name: code for code, name in self._language_names.items()})
+        return self._registry.index.codes
+
+    @property
+    def language_index(self) -> LanguageIndex:
+        """Returns the lookups over the current languages, rebuilt whenever they change"""
+        return self._registry.index
 
     @cached_property
     def default_provider(self) -> BaseProvider:
@@ -38,8 +129,130 @@ class AsyncTranslate:
 
     async def close(self):
         """Close all Provider aiohttp loops"""
+        if self._refresher is not None:
+            self._refresher.cancel()
+            self._refresher = None
+        for fetch in list(self._language_fetches):
+            fetch.cancel()
+        if self._coalescer:
+            await self._coalescer.close()
+        if self.cache:
+            await self.cache.close()
+        if self.quota is not None:
+            await self.quota.close()
         for provider in self._providers.values():
             await provider.close()
+        if self._owns_session_manager:
+            await self.session_manager.close()
+
+    @staticmethod
+    async def _throttle(provider: BaseProvider, characters: int = 0):
+        """Apply the provider's rate limit, unless it throttles its requests itself"""
+        if not provider.throttles_requests:
+            await provider.throttle(characters)
+
+    async def _get_languages(self, provider: BaseProvider, **kwargs) -> Dict[str, str]:
+        await self._throttle(provider)
+        return await provider.get_languages(**kwargs)
+
+    def _register(self, provider: BaseProvider) -> str:
+        """Add a provider without its languages, returning its name"""
+        provider_name = provider.name.casefold()
+        self._providers[provider_name] = provider
+        if provider.session_manager is None:
+            provider.session_manager = self.session_manager
+        if self._circuit_breaker:
+            self._breakers[provider_name] = self._circuit_breaker()
+        return provider_name
+
+    def _set_languages(self, languages: Mapping[str, Mapping[str, str]]):
+        """Replace the languages of some providers, {'provider_name': {'en': 'English'} }"""
+        self._swap(self._registry.replace(languages, time.time(), self._providers))
+
+    def _swap(self, registry: LanguageRegistry):
+        """Switch to a new registry, invalidating everything derived from the previous one"""
+        self._registry = registry
+        self.__dict__.pop('default_provider', None)
+        self.router.update(registry.languages, self._providers)
+
+    def _fetch_languages(self, provider_name: str, fetch: asyncio.Future):
+        """Set languages that arrived in the background, the current ones are kept if the fetch failed"""
+        self._language_fetches.discard(fetch)
+        if fetch.cancelled() or fetch.exception() is not None or provider_name not in self._providers:
+            return
+        self._set_languages({provider_name: fetch.result()})
+
+    def _fetch_in_background(self, provider_name: str, fetch: Optional[asyncio.Future] = None):
+        if fetch is None:
+            fetch = asyncio.ensure_future(self._get_languages(self._providers[provider_name]))
+        self._language_fetches.add(fetch)
+        fetch.add_done_callback(partial(self._fetch_languages, provider_name))
+
+    def _restore(self, provider_name: str) -> bool:
+        """Use the provider's languages from the loaded snapshot, refreshing them in the background"""
+        languages = self._snapshot.pop(provider_name, None)
+        if languages is None:
+            return False
+        self._set_languages({provider_name: languages})
+        self._fetch_in_background(provider_name)
+        return True
+
+    async def save_languages(self, path: str):
+        """Write the registry to a file, for load_languages to restore on the next start"""
+        # Names are stored once, providers only list the names that differ
+        registry = self._registry
+        names = dict(registry.names)
+        providers = {
+            provider_name: {
+                'updated': registry.updated[provider_name],
+                'languages': list(languages),
+                'names': {code: name for code, name in languages.items() if names.get(code) != name}
+            }
+            for provider_name, languages in registry.provider_languages.items()
+        }
+        data = serializers.dumps({'version': self.SNAPSHOT_VERSION, 'names': names, 'providers': providers})
+
+        def write():
+            temporary = f"{path}.tmp"
+            with open(temporary, 'wb') as file:
+                file.write(data)
+            os.replace(temporary, path)
+
+        await asyncio.get_running_loop().run_in_executor(None, write)
+
+    async def load_languages(self, path: str, max_age: Optional[float] = None) -> bool:
+        """
+        Load a registry saved by save_languages, providers added afterwards use it instead of waiting for
+        get_languages and are refreshed in the background
+        :param max_age: Optional seconds after which a provider's saved languages are ignored
+        :return: Whether the file could be used, a missing or invalid file is ignored
+        """
+        def read():
+            with open(path, 'rb') as file:
+                return file.read()
+
+        try:
+            data = serializers.loads(await asyncio.get_running_loop().run_in_executor(None, read))
+        except (OSError, serializers.JSONDecodeError):
+            return False
+        if not isinstance(data, dict) or data.get('version') != self.SNAPSHOT_VERSION:
+            return False
+
+        now = time.time()
+        snapshot: Dict[str, Dict[str, str]] = {}
+        try:
+            names = data['names']
+            for provider_name, saved in data['providers'].items():
+                if max_age is not None and now - saved['updated'] > max_age:
+                    continue
+                languages = {code: saved['names'].get(code, names[code]) for code in saved['languages']}
+                if not all(isinstance(code, str) and isinstance(name, str) for code, name in languages.items()):
+                    return False
+                snapshot[provider_name] = languages
+        except (KeyError, TypeError, AttributeError):
+            return False
+        self._snapshot.update(snapshot)
+        return True
 
     async def add_provider(self, provider: BaseProvider):
         """Add a translator provider"""
@@ -50,36 +263,507 @@ class AsyncTranslate:
         provider_name = provider.name.casefold()
         if provider_name in self._providers:
             raise ProviderAlreadyAdded(provider_name)
-        self._providers[provider_name] = provider
+        self._register(provider)
+        self._start_refresher()
+        if not self._restore(provider_name):
+            self._set_languages({provider_name: await self._get_languages(provider)})
 
-        languages = await provider.get_languages()
-        for code, language_name in languages.items():
-            self._language_names[code] = language_name
-            if code in self._languages:
-                self._languages[code].add(provider_name)
+    async def add_providers(self, *backends: BaseProvider, timeout: Optional[float] = None):
+        """
+        Add multiple providers, fetching their languages concurrently
+        Language names of later providers win, like with add_provider.
+        :param timeout: Optional seconds to wait for the languages. Providers still fetching them are added anyway,
+        their languages are set in the background once they arrive.
+        """
+        names = []
+        for provider in backends:
+            if not isinstance(provider, BaseProvider):
+                raise TypeError('Providers must derive from BaseProvider')
+            provider_name = provider.name.casefold()
+            if provider_name in self._providers or provider_name in names:
+                raise ProviderAlreadyAdded(provider_name)
+            names.append(provider_name)
+        for provider in backends:
+            self._register(provider)
+        self._start_refresher()
+        fetches = {provider_name: asyncio.ensure_future(self._get_languages(provider))
+                   for provider_name, provider in zip(names, backends) if not self._restore(provider_name)}
+        if not fetches:
+            return
+        done, _ = await asyncio.wait(fetches.values(), timeout=timeout)
+
+        error = None
+        fetched = {}
+        for provider_name, fetch in fetches.items():
+            if fetch not in done:
+                self._fetch_in_background(provider_name, fetch)
+            elif fetch.exception() is not None:
+                error = error or fetch.exception()
             else:
-                self._languages[code] = {provider_name}
+                fetched[provider_name] = fetch.result()
+        self._set_languages(fetched)
+        if error is not None:
+            raise error
+
+    async def refresh_languages(self):
+        """
+        Fetch every provider's languages again and swap them in at once
+        Providers whose fetch fails keep their current languages.
+        """
+        names = list(self._providers)
+        results = await asyncio.gather(*(self._get_languages(self._providers[name]) for name in names),
+                                       return_exceptions=True)
+        fetched = {name: languages for name, languages in zip(names, results)
+                   if not isinstance(languages, BaseException)}
+        if fetched:
+            self._set_languages(fetched)
+
+    async def add_localized_names(self, *locales: str):
+        """
+        Fetch every provider's language names in other languages, so resolve_language understands them too
+        :param locales: language codes, such as 'es' to resolve "español" or "inglés"
+        """
+        localized: Dict[str, Dict[str, str]] = {}
+        for locale in locales:
+            results = await asyncio.gather(*(self._get_languages(provider, locale=locale)
+                                             for provider in self._providers.values()), return_exceptions=True)
+            localized[locale] = {}
+            for languages in results:
+                if not isinstance(languages, BaseException):
+                    localized[locale].update(languages)
+        registry = self._registry
+        for locale, names in localized.items():
+            registry = registry.with_localized(locale, names, self._providers)
+        self._swap(registry)
+
+    def resolve_language(self, language: str) -> Optional[str]:
+        """
+        Code of the language user input refers to, None when nothing matches
+        Accepts codes, English names, common aliases and names added with add_localized_names, in any case and
+        with or without accents, as well as prefixes ("chin") and small typos ("portugese").
+        """
+        return self._registry.resolver.resolve(language)
+
+    async def _refresh_periodically(self):
+        while True:
+            await asyncio.sleep(self.language_refresh_interval)
+            await self.refresh_languages()
 
-    async def add_providers(self, *backends: [BaseProvider]):
-        """Add multiple providers"""
-        for b in backends:
-            await self.add_provider(b)
+    def _start_refresher(self):
+        if self.language_refresh_interval is not None and self._refresher is None:
+            self._refresher = asyncio.ensure_future(self._refresh_periodically())
 
     def provider_for(self, language: str, preferred: Optional[str] = "") -> BaseProvider:
-        try:
-            available_providers = list(self._languages[language])
-        except KeyError:
-            raise LanguageNotSupported(language)
-        return self._providers[preferred if preferred in available_providers else available_providers[0]]
+        """
+        Returns the provider to translate to language with
+        The preferred provider is used when it supports the language and is healthy, otherwise the fastest healthy one.
+        """
+        return self._providers[self.router.select(language, preferred)]
 
     async def translate(self, to: str, content: str, provider: BaseProvider,
-                        source_language: Optional[str] = None, **options) -> Translation:
+                        source_language: Optional[str] = None, hedge_after: Optional[float] = None,
+                        hedge_percentile: Optional[float] = None, deadline: Optional[float] = None,
+                        tenant: Optional[Hashable] = None, **options) -> Translation:
+        """
+        Translate content to a language
+        :param hedge_after: Optional seconds after which the translation is also sent to the next best provider
+        supporting the language, the first to answer is used and the other cancelled
+        :param hedge_percentile: Optional fraction (0-1), hedge once the provider takes longer than this percentile of
+        its recent latencies for the language. Falls back to hedge_after until enough requests were measured.
+        :param deadline: Optional seconds the whole call may take, retries stop and each request's timeout shrinks
+        as it approaches. DeadlineExceeded is raised once it passes, also while waiting on a request shared with other
+        calls.
+        :param tenant: Optional id the characters are charged to, when a quota ledger is set. NotEnoughCharacters is
+        raised before any request when its balance for the provider is too low, failed translations are refunded.
+        Hedged translations are charged to the provider that answered.
+        """
         # Assumes to & source_language are valid language codes
         if source_language and source_language == to:
             raise DetectedAsSameError(to_language=to, detected_language=source_language)
 
+        if self.skip_untranslatable and is_untranslatable(content):
+            return Translation(text=content, to=to, source=source_language)
+
+        with deadline_scope(deadline):
+            provider = self._failover(provider, to, source_language)
+            hedge_delay = hedge_after
+            if hedge_percentile is not None:
+                stats = self.router.stats(provider.name.casefold(), to)
+                if len(stats.recent) >= self.HEDGE_MIN_SAMPLES:
+                    hedge_delay = stats.percentile(hedge_percentile)
+
+            reservation = None
+            if self.quota is not None and tenant is not None:
+                reservation = await self.quota.reserve(tenant, provider.name.casefold(), len(content))
+            try:
+                if self.mask_untranslatable and (masked := mask(content)).spans:
+                    translation = await within_deadline(self._translate_detected(
+                        provider, masked.text, to, source_language, hedge_delay, options, reservation))
+                    translation = replace(translation, text=masked.restore(translation.text))
+                else:
+                    translation = await within_deadline(self._translate_detected(
+                        provider, content, to, source_language, hedge_delay, options, reservation))
+            except BaseException:
+                if reservation is not None:
+                    self.quota.refund(reservation)
+                raise
+            if reservation is not None:
+                self.quota.commit(reservation)
+            return translation
+
+    async def _translate_detected(self, provider: BaseProvider, content: str, to: str, source_language: Optional[str],
+                                  hedge_delay: Optional[float], options: dict,
+                                  reservation: Optional[Reservation] = None) -> Translation:
+        """Translate content, raising DetectedAsSameError when it's detected to already be in the target language"""
+        hedged = partial(self._translate_hedged, provider, content, to, source_language, hedge_delay, options,
+                         reservation)
+        if (detected_language := self._detect_locally(provider, content)) is not None:
+            if to == detected_language:
+                raise DetectedAsSameError(to_language=to, detected_language=detected_language)
+            return await hedged()
+
+        if self.inline_detection and provider.detects_inline:
+            # Single round trip, the provider reports the detected language with the translation
+            translation = await hedged()
+            if translation.source == to:
+                raise DetectedAsSameError(to_language=to, detected_language=translation.source)
+            return translation
+
+        if self.concurrent_detection:
+            detection = asyncio.ensure_future(self._detect(provider, self._detection_sample(provider, content)))
+            try:
+                translation = await hedged()
+            except BaseException:
+                detection.cancel()
+                raise
+            detected_language = await detection
+            if to == detected_language:
+                raise DetectedAsSameError(to_language=to, detected_language=detected_language)
+            return translation
+
         # Detect translating to/from same language
-        detected_language = await provider.detect(content.strip())
+        detected_language = await self._detect(provider, self._detection_sample(provider, content))
         if to == detected_language:
             raise DetectedAsSameError(to_language=to, detected_language=detected_language)
-        return await provider.translate(content, to=to, source=source_language, **options)
+        return await hedged()
+
+    def _available(self, provider_name: str) -> bool:
+        """Whether the provider's circuit breaker would let a request through"""
+        breaker = self._breakers.get(provider_name)
+        return breaker is None or breaker.available()
+
+    def _alternative(self, to: str, exclude: str, source: Optional[str] = None) -> Optional[BaseProvider]:
+        """
+        Best other provider supporting the languages whose circuit breaker lets a request through
+        A half-open breaker's single probe is taken, so only one request goes to a recovering provider.
+        """
+        alternative = self.router.alternative(to, exclude, source, self._available)
+        if alternative is None:
+            return None
+        if breaker := self._breakers.get(alternative):
+            breaker.allow()
+        return self._providers[alternative]
+
+    def _failover(self, provider: BaseProvider, to: str, source: Optional[str] = None) -> BaseProvider:
+        """Returns provider, or another provider supporting the languages while its circuit breaker is open"""
+        provider_name = provider.name.casefold()
+        breaker = self._breakers.get(provider_name)
+        if breaker is None or breaker.allow():
+            return provider
+        alternative = self._alternative(to, provider_name, source)
+        if alternative is None:
+            raise ProviderUnavailable(provider_name, to, source)
+        return alternative
+
+    def _record(self, provider: BaseProvider, duration: float, failed: bool = False, language: Optional[str] = None):
+        """Record the outcome of a provider request for routing and circuit breaking"""
+        provider_name = provider.name.casefold()
+        if language:
+            self.router.record(provider_name, language, duration, failed)
+        if breaker := self._breakers.get(provider_name):
+            breaker.record(duration, failed)
+
+    async def _translate_hedged(self, provider: BaseProvider, content: str, to: str, source: Optional[str],
+                                hedge_delay: Optional[float], options: dict,
+                                reservation: Optional[Reservation] = None) -> Translation:
+        """
+        Translate with provider, racing the next best provider when it hasn't answered after hedge_delay
+        :param reservation: Optional characters reserved with provider, moved to the alternative when it wins. The
+        alternative is only raced when the tenant has enough characters left with it too.
+        """
+        if hedge_delay is None:
+            return await self._translate(provider, content, to, source, **options)
+
+        primary = asyncio.ensure_future(self._translate(provider, content, to, source, **options))
+        pending = {primary}
+        alternative_reservation = None
+        try:
+            done, pending = await asyncio.wait(pending, timeout=hedge_delay)
+            if not done:
+                alternative = self._alternative(to, provider.name.casefold(), source)
+                if alternative is not None and reservation is not None:
+                    try:
+                        alternative_reservation = await self.quota.reserve(
+                            reservation.tenant, alternative.name.casefold(), reservation.characters)
+                    except NotEnoughCharacters:
+                        alternative = None
+                if alternative is not None:
+                    pending.add(asyncio.ensure_future(self._translate(alternative, content, to, source, **options)))
+
+            # The first successful translation wins, the primary's error is raised if all of them fail
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if not task.cancelled() and task.exception() is None:
+                        if task is not primary and alternative_reservation is not None:
+                            # Release the primary's hold, the caller settles the alternative's one instead
+                            self.quota.refund(reservation)
+                            reservation.provider, reservation.settled = alternative_reservation.provider, False
+                            alternative_reservation = None
+                        return task.result()
+            return primary.result()
+        finally:
+            for task in pending:
+                task.cancel()
+            if alternative_reservation is not None:
+                self.quota.refund(alternative_reservation)
+
+    async def _translate(self, provider: BaseProvider, content: str, to: str, source: Optional[str] = None,
+                         **options) -> Translation:
+        """Send a single translation to the provider, through the cache, single flight and coalescer when enabled"""
+        if self._oversized(provider, content):
+            return await self._translate_chunked(provider, content, to, source, options)
+
+        if self.cache:
+            key = self.cache.translation_key(provider, content, to, source, options)
+            if (translation := await self.cache.get_translation(key)) is not None:
+                return translation
+
+        if self._in_flight is not None:
+            flight_key = ('translate', provider.name.casefold(), content, to, source or "", freeze_options(options))
+            return await self._in_flight.do(flight_key,
+                                            lambda: self._fetch_translation(provider, content, to, source, options))
+        return await self._fetch_translation(provider, content, to, source, options)
+
+    async def _fetch_translation(self, provider: BaseProvider, content: str, to: str, source: Optional[str],
+                                 options: dict) -> Translation:
+        start = time.monotonic()
+        try:
+            if self._coalescer:
+                translation = await self._coalescer.translate(provider, content, to, source, **options)
+            else:
+                await self._throttle(provider, len(content))
+                translation = await provider.translate(content, to=to, source=source, **options)
+        except (LanguageNotSupported, asyncio.CancelledError):
+            raise
+        except Exception:
+            self._record(provider, time.monotonic() - start, failed=True, language=to)
+            raise
+        self._record(provider, time.monotonic() - start, language=to)
+
+        if self.detection_cache is not None and not source and translation.source:
+            self.detection_cache.set(provider.name.casefold(), content.strip(), translation.source)
+        if self.cache:
+            await self.cache.set_translation(self.cache.translation_key(provider, content, to, source, options),
+                                             translation)
+        return translation
+
+    def _detect_locally(self, provider: BaseProvider, content: str) -> Optional[str]:
+        """Language of content from the local detector, None when unsure or the provider doesn't support it"""
+        if self.local_detector is None:
+            return None
+        result = self.local_detector.detect(content)
+        if result is None or result[1] < self.local_detector.threshold:
+            return None
+        if not self._registry.index.supports(provider.name.casefold(), result[0]):
+            return None
+        return result[0]
+
+    async def _detect(self, provider: BaseProvider, content: str) -> str:
+        """Detect the language of content with the provider, through the caches and single flight when enabled"""
+        if self.detection_cache is not None and \
+                (language := self.detection_cache.get(provider.name.casefold(), content)) is not None:
+            return language
+
+        if self.cache:
+            key = self.cache.detection_key(provider, content)
+            if (language := await self.cache.get_detection(key)) is not None:
+                return language
+
+        if self._in_flight is not None:
+            return await self._in_flight.do(('detect', provider.name.casefold(), content),
+                                            lambda: self._fetch_detection(provider, content))
+        return await self._fetch_detection(provider, content)
+
+    async def _fetch_detection(self, provider: BaseProvider, content: str) -> str:
+        start = time.monotonic()
+        try:
+            await self._throttle(provider, len(content))
+            language = await provider.detect(content)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self._record(provider, time.monotonic() - start, failed=True)
+            raise
+        self._record(provider, time.monotonic() - start)
+
+        if self.detection_cache is not None:
+            self.detection_cache.set(provider.name.casefold(), content, language)
+        if self.cache:
+            await self.cache.set_detection(self.cache.detection_key(provider, content), language)
+        return language
+
+    async def translate_many(self, to: str, contents: Sequence[str], provider: BaseProvider,
+                             source_language: Optional[str] = None, **options) -> List[Translation]:
+        """
+        Translate multiple texts using as few provider requests as possible
+        Texts are packed into batches that fit the provider's max_batch_size and max_batch_characters.
+        Like translate, another provider is used while the provider's circuit breaker is open.
+        :return: the translations, in the same order as contents
+        """
+        # Assumes to & source_language are valid language codes
+        if source_language and source_language == to:
+            raise DetectedAsSameError(to_language=to, detected_language=source_language)
+
+        provider = self._failover(provider, to, source_language)
+        return await self._translate_many(provider, contents, to, source_language, options)
+
+    async def translate_stream(self, to: str, contents: Union[AsyncIterable[str], Iterable[str]],
+                               provider: BaseProvider, source_language: Optional[str] = None,
+                               batch_size: Optional[int] = None, concurrency: int = 4, ordered: bool = True,
+                               **options) -> AsyncIterator[Translation]:
+        """
+        Translate texts from an (async) iterable, yielding the translations as they are ready
+        Texts are read into batches and at most `concurrency` batches are in flight, so memory stays flat however long
+        the input is and the input is only read as fast as translations are consumed.
+        :param batch_size: Optional texts per batch, defaults to the provider's max_batch_size
+        :param concurrency: batches translated at the same time
+        :param ordered: yield translations in input order, otherwise batches are yielded as they complete
+        Like translate, another provider is used while the provider's circuit breaker is open when the stream starts.
+        """
+        # Assumes to & source_language are valid language codes
+        if source_language and source_language == to:
+            raise DetectedAsSameError(to_language=to, detected_language=source_language)
+
+        provider = self._failover(provider, to, source_language)
+
+        batch_size = batch_size or provider.max_batch_size
+        max_characters = provider.max_batch_characters
+        pending: Deque[asyncio.Future] = deque()
+
+        async def batches():
+            batch: List[str] = []
+            characters = 0
+            async for content in _aiter(contents):
+                if batch and (len(batch) >= batch_size or
+                              (max_characters and characters + len(content) > max_characters)):
+                    yield batch
+                    batch, characters = [], 0
+                batch.append(content)
+                characters += len(content)
+            if batch:
+                yield batch
+
+        try:
+            async for batch in batches():
+                pending.append(asyncio.ensure_future(
+                    self._translate_many(provider, batch, to, source_language, options)))
+                while len(pending) >= concurrency:
+                    for translation in await self._next_batch(pending, ordered):
+                        yield translation
+            while pending:
+                for translation in await self._next_batch(pending, ordered):
+                    yield translation
+        finally:
+            for task in pending:
+                task.cancel()
+
+    @staticmethod
+    async def _next_batch(pending: Deque[asyncio.Future], ordered: bool) -> List[Translation]:
+        """Wait for the first batch in pending, or any batch when not ordered, and remove it"""
+        if ordered:
+            task = pending[0]
+            await asyncio.wait((task,))
+        else:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            task = next(iter(done))
+        pending.remove(task)
+        return task.result()
+
+    async def _translate_many(self, provider: BaseProvider, contents: Sequence[str], to: str, source: Optional[str],
+                              options: dict, split_oversized: bool = True) -> List[Translation]:
+        translations: List[Optional[Translation]] = [None] * len(contents)
+        if self.cache:
+            keys = [self.cache.translation_key(provider, content, to, source, options) for content in contents]
+            for index, key in enumerate(keys):
+                translations[index] = await self.cache.get_translation(key)
+        missing = [index for index, translation in enumerate(translations) if translation is None]
+        oversized = [index for index in missing if split_oversized and self._oversized(provider, contents[index])]
+        if oversized:
+            missing = [index for index in missing if index not in oversized]
+        missing_contents = [contents[index] for index in missing]
+
+        batches, chunked = await asyncio.gather(
+            asyncio.gather(*(
+                self._fetch_batch(provider, missing_contents[start:end], to, source, options)
+                for start, end in batch_ranges(missing_contents, provider.max_batch_size,
+                                               provider.max_batch_characters)
+            )),
+            asyncio.gather(*(self._translate_chunked(provider, contents[index], to, source, options)
+                             for index in oversized))
+        )
+        for index, translation in zip(missing, (translation for batch in batches for translation in batch)):
+            translations[index] = translation
+            if self.cache:
+                await self.cache.set_translation(keys[index], translation)
+        for index, translation in zip(oversized, chunked):
+            translations[index] = translation
+        return translations
+
+    async def _fetch_batch(self, provider: BaseProvider, contents: Sequence[str], to: str, source: Optional[str],
+                           options: dict) -> List[Translation]:
+        start = time.monotonic()
+        try:
+            await self._throttle(provider, sum(map(len, contents)))
+            translations = await provider.translate_batch(contents, to=to, source=source, **options)
+        except (LanguageNotSupported, asyncio.CancelledError):
+            raise
+        except Exception:
+            self._record(provider, time.monotonic() - start, failed=True, language=to)
+            raise
+        self._record(provider, time.monotonic() - start, language=to)
+        return translations
+
+    @staticmethod
+    def _oversized(provider: BaseProvider, content: str) -> bool:
+        return bool(provider.max_characters) and len(content) > provider.max_characters
+
+    @classmethod
+    def _detection_sample(cls, provider: BaseProvider, content: str) -> str:
+        """Text to detect the language of content from, its first chunk when it's too long for the provider"""
+        content = content.strip()
+        if cls._oversized(provider, content):
+            return split_text(content, provider.max_characters)[0].strip()
+        return content
+
+    async def _translate_chunked(self, provider: BaseProvider, content: str, to: str, source: Optional[str],
+                                 options: dict) -> Translation:
+        """
+        Translate content longer than the provider's max_characters
+        It is split on paragraph and sentence boundaries, the chunks are translated in batches and joined back together
+        keeping the original whitespace around them. The detected source is the one covering most of the text.
+        """
+        pieces = [strip_chunk(chunk) for chunk in split_text(content, provider.max_characters)]
+        bodies = [body for _, body, _ in pieces if body]
+        translations = iter(await self._translate_many(provider, bodies, to, source, options, split_oversized=False))
+
+        text = []
+        sources: Counter = Counter()
+        for leading, body, trailing in pieces:
+            text.append(leading)
+            if body:
+                translation = next(translations)
+                text.append(translation.text)
+                sources[translation.source] += len(body)
+            text.append(trailing)
+        return Translation(text="".join(text), to=to, source=sources.most_common(1)[0][0] if sources else source)
@@ -0,0 +1,24 @@
+from typing import Iterator, Optional, Sequence, Tuple
+
+
+def batch_ranges(contents: Sequence[str], max_size: int,
+                 max_characters: Optional[int] = None) -> Iterator[Tuple[int, int]]:
+    """
+    Split contents into consecutive (start, end) ranges that fit a provider's request limits
+    :param contents: the texts to split up
+    :param max_size: the maximum amount of texts in one request
+    :param max_characters: Optional maximum amount of characters in one request
+    A single text longer than max_characters is given a range of its own.
+    """
+    max_size = max(max_size, 1)
+    start = 0
+    characters = 0
+    for index, content in enumerate(contents):
+        size = index - start
+        if size and (size >= max_size or (max_characters and characters + len(content) > max_characters)):
+            yield start, index
+            start = index
+            characters = 0
+        characters += len(content)
+    if start < len(contents):
+        yield start, len(contents)
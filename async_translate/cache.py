@@ -0,0 +1,275 @@
+import asyncio
+import hashlib
+import sqlite3
+import time
+import unicodedata
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from typing import Any, Mapping, Optional, Tuple
+
+from . import serializers
+from .abc import BaseProvider, Translation
+from .utils import freeze_options
+
+try:
+    import msgpack
+except ModuleNotFoundError:
+    msgpack = None
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+
+class CacheBackend(ABC):
+    """Storage used by TranslationCache. Values are Translation objects or detected language codes."""
+    evictions = 0
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def set(self, key: str, value: Any):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def clear(self):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class LRUCache(CacheBackend):
+    """In-memory backend evicting the least recently used entries"""
+
+    def __init__(self, maxsize: int = 10000, ttl: Optional[float] = None):
+        """
+        :param maxsize: the maximum amount of entries to keep
+        :param ttl: Optional seconds after which an entry expires
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._store: "OrderedDict[str, Tuple[Optional[float], Any]]" = OrderedDict()
+
+    def __len__(self):
+        return len(self._store)
+
+    async def get(self, key: str) -> Optional[Any]:
+        try:
+            expires, value = self._store[key]
+        except KeyError:
+            return None
+        if expires is not None and expires < time.monotonic():
+            del self._store[key]
+            self.evictions += 1
+            return None
+        self._store.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Any):
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        self._store[key] = (expires, value)
+        self._store.move_to_end(key)
+        while len(self._store) > self.maxsize:
+            self._store.popitem(last=False)
+            self.evictions += 1
+
+    async def clear(self):
+        self._store.clear()
+
+
+class SQLiteCache(CacheBackend):
+    """
+    Persistent backend storing entries in an SQLite database in WAL mode
+    All database access runs on a dedicated thread so the event loop is never blocked.
+    Entries are serialized with msgpack when it is installed, otherwise as JSON. Entries that can't be read, such as
+    msgpack entries once it is uninstalled, count as misses and are removed.
+    """
+
+    def __init__(self, path: str, maxsize: int = 1000000, ttl: Optional[float] = None):
+        """
+        :param path: the database file, created if it doesn't exist
+        :param maxsize: the maximum amount of entries to keep, least recently used entries are evicted past this
+        :param ttl: Optional seconds after which an entry expires
+        """
+        self.path = path
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='async_translate_cache')
+        self._db: Optional[sqlite3.Connection] = None
+        self._size: Optional[int] = None
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS entries ("
+                             "key BLOB PRIMARY KEY, value BLOB NOT NULL, expires REAL, accessed REAL NOT NULL)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+            self._size = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        return self._db
+
+    @staticmethod
+    def _hash(key: str) -> bytes:
+        return hashlib.blake2b(key.encode(), digest_size=16).digest()
+
+    @staticmethod
+    def _dumps(value: Any) -> bytes:
+        if isinstance(value, Translation):
+            value = ['t', value.text, value.to, value.source]
+        else:
+            value = ['d', value]
+        # The first byte records the format, so entries can be read whether or not msgpack is installed later
+        if msgpack:
+            return b'm' + msgpack.packb(value)
+        return b'j' + serializers.dumps(value)
+
+    @staticmethod
+    def _loads(data: bytes) -> Any:
+        """Raises ValueError, TypeError or IndexError for corrupt entries or ones needing msgpack without it"""
+        data = bytes(data)
+        if data[:1] == b'm' and msgpack:
+            value = msgpack.unpackb(data[1:])
+        elif data[:1] == b'j':
+            value = serializers.loads(data[1:])
+        else:
+            raise ValueError("Unreadable cache entry")
+        if value[0] == 't':
+            return Translation(text=value[1], to=value[2], source=value[3])
+        return value[1]
+
+    def _get(self, key: bytes) -> Optional[Any]:
+        db = self._connection()
+        row = db.execute("SELECT value, expires FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if row[1] is not None and row[1] < now:
+            db.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._size -= 1
+            self.evictions += 1
+            return None
+        try:
+            value = self._loads(row[0])
+        except (ValueError, TypeError, IndexError):
+            db.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._size -= 1
+            return None
+        db.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+        return value
+
+    def _set(self, key: bytes, value: bytes):
+        db = self._connection()
+        now = time.time()
+        expires = now + self.ttl if self.ttl is not None else None
+        existed = db.execute("SELECT 1 FROM entries WHERE key = ?", (key,)).fetchone() is not None
+        db.execute("INSERT OR REPLACE INTO entries (key, value, expires, accessed) VALUES (?, ?, ?, ?)",
+                   (key, value, expires, now))
+        if not existed:
+            self._size += 1
+        if self._size > self.maxsize:
+            # Evict a little extra so every insert past the limit doesn't pay for a delete
+            excess = self._size - self.maxsize + max(self.maxsize // 100, 1)
+            removed = db.execute("DELETE FROM entries WHERE key IN "
+                                 "(SELECT key FROM entries ORDER BY accessed LIMIT ?)", (excess,)).rowcount
+            self._size -= removed
+            self.evictions += removed
+
+    def _clear(self):
+        self._connection().execute("DELETE FROM entries")
+        self._size = 0
+
+    def _compact(self):
+        db = self._connection()
+        removed = db.execute("DELETE FROM entries WHERE expires IS NOT NULL AND expires < ?", (time.time(),)).rowcount
+        self._size -= removed
+        self.evictions += removed
+        db.execute("VACUUM")
+        db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def _close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    async def get(self, key: str) -> Optional[Any]:
+        return await self._run(self._get, self._hash(key))
+
+    async def set(self, key: str, value: Any):
+        await self._run(self._set, self._hash(key), self._dumps(value))
+
+    async def clear(self):
+        await self._run(self._clear)
+
+    async def compact(self):
+        """Remove expired entries and reclaim their disk space"""
+        await self._run(self._compact)
+
+    async def close(self):
+        await self._run(self._close)
+        self._executor.shutdown(wait=False)
+
+
+class TranslationCache:
+    """Caches provider translate and detect results in a CacheBackend"""
+
+    def __init__(self, backend: Optional[CacheBackend] = None):
+        self.backend = backend if backend is not None else LRUCache()
+        self._hits = 0
+        self._misses = 0
+
+    @property
+    def stats(self) -> CacheStats:
+        return CacheStats(hits=self._hits, misses=self._misses, evictions=self.backend.evictions)
+
+    @staticmethod
+    def normalize(content: str, strip: bool = False) -> str:
+        """
+        NFC normalize content for keys
+        :param strip: also ignore surrounding whitespace, only for detection as translations keep the whitespace
+        """
+        return unicodedata.normalize('NFC', content.strip() if strip else content)
+
+    def translation_key(self, provider: BaseProvider, content: str, to: str, source: Optional[str] = None,
+                        options: Optional[Mapping[str, Any]] = None) -> str:
+        return "\x1f".join(('translate', provider.name.casefold(), to, source or "",
+                            repr(freeze_options(options or {})), self.normalize(content)))
+
+    def detection_key(self, provider: BaseProvider, content: str) -> str:
+        return "\x1f".join(('detect', provider.name.casefold(), self.normalize(content, strip=True)))
+
+    async def _get(self, key: str) -> Optional[Any]:
+        value = await self.backend.get(key)
+        if value is None:
+            self._misses += 1
+        else:
+            self._hits += 1
+        return value
+
+    async def get_translation(self, key: str) -> Optional[Translation]:
+        translation = await self._get(key)
+        # Hand out copies so callers can't modify the cached entry
+        return replace(translation) if translation is not None else None
+
+    async def set_translation(self, key: str, translation: Translation):
+        await self.backend.set(key, replace(translation))
+
+    async def get_detection(self, key: str) -> Optional[str]:
+        return await self._get(key)
+
+    async def set_detection(self, key: str, language: str):
+        await self.backend.set(key, language)
+
+    async def close(self):
+        await self.backend.close()
@@ -77,3 +77,21 @@ class CaseInsensitiveDict(MutableMapping):
 
     def __repr__(self):
         return str(dict(self.items()))
+
+
+class FrozenCaseInsensitiveDict(CaseInsensitiveDict):
+    """A read-only ``CaseInsensitiveDict``, safe to share between callers.
+    ``copy()`` returns a regular, mutable ``CaseInsensitiveDict``.
+    """
+
+    def __init__(self, data=None, **kwargs):
+        super().__init__(data, **kwargs)
+        self._frozen = True
+
+    def __setitem__(self, key: str, value):
+        if getattr(self, '_frozen', False):
+            raise TypeError("FrozenCaseInsensitiveDict does not support item assignment")
+        super().__setitem__(key, value)
+
+    def __delitem__(self, key: str):
+        raise TypeError("FrozenCaseInsensitiveDict does not support item deletion")
@@ -0,0 +1,70 @@
+import re
+from bisect import bisect_right
+from typing import List, Sequence, Tuple
+
+# Spans that must never be split: code blocks, inline code and markup tags
+PROTECTED = re.compile(r"```.*?```|`[^`\n]+`|<[^<>\n]+>", re.DOTALL)
+
+# Places a text can be split, most preferred first. Whitespace stays with the chunk before the split.
+BOUNDARIES: Sequence[re.Pattern] = (
+    re.compile(r"\n[ \t]*\n\s*"),  # Paragraphs
+    re.compile(r"\n\s*"),  # Lines
+    re.compile(r"(?<=[.!?…])[\"'”’)\]]*\s+|[。！？]+[\"'”’)\]」』]*\s*"),  # Sentences
+    re.compile(r"\s+"),  # Words
+)
+
+
+def _protected_spans(text: str) -> Tuple[List[int], List[int]]:
+    starts, ends = [], []
+    for match in PROTECTED.finditer(text):
+        starts.append(match.start())
+        ends.append(match.end())
+    return starts, ends
+
+
+def _inside(position: int, starts: List[int], ends: List[int]) -> bool:
+    """Whether position falls strictly inside a protected span"""
+    index = bisect_right(starts, position) - 1
+    return index >= 0 and starts[index] < position < ends[index]
+
+
+def split_text(text: str, limit: int) -> List[str]:
+    """
+    Split text into chunks of at most limit characters, which join back into the original text
+    Splits on paragraph, then line, then sentence, then word boundaries, never inside code or markup.
+    A protected span longer than limit is kept whole.
+    """
+    if len(text) <= limit:
+        return [text]
+    starts, ends = _protected_spans(text)
+    chunks = []
+    start = 0
+    while len(text) - start > limit:
+        end = None
+        window = text[start:start + limit]
+        for boundary in BOUNDARIES:
+            positions = [start + match.end() for match in boundary.finditer(window)
+                         if not _inside(start + match.end(), starts, ends)]
+            if positions:
+                end = positions[-1]
+                break
+        if end is None:
+            # No boundary, cut at the limit unless that lands in a protected span
+            end = start + limit
+            index = bisect_right(starts, end) - 1
+            if index >= 0 and starts[index] < end < ends[index]:
+                end = starts[index] if starts[index] > start else ends[index]
+        chunks.append(text[start:end])
+        start = end
+    if start < len(text):
+        chunks.append(text[start:])
+    return chunks
+
+
+def strip_chunk(chunk: str) -> Tuple[str, str, str]:
+    """Split a chunk into leading whitespace, the text to translate, and trailing whitespace"""
+    body = chunk.strip()
+    if not body:
+        return chunk, "", ""
+    leading = chunk[:len(chunk) - len(chunk.lstrip())]
+    return leading, body, chunk[len(leading) + len(body):]
@@ -0,0 +1,88 @@
+import time
+from collections import deque
+from typing import Deque, Optional, Tuple
+
+
+class CircuitBreaker:
+    """
+    Stops sending requests to a provider that keeps failing or is too slow
+    Closed: requests flow and outcomes are recorded over a rolling window.
+    Open: entered once the failure or slow call rate is exceeded, requests are refused for open_duration seconds.
+    Half-open: a single probe request is let through, closing the breaker on success or opening it again on failure.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_rate: float = 0.5, slow_call_duration: Optional[float] = None,
+                 slow_call_rate: float = 0.8, window: int = 20, minimum_calls: int = 10, open_duration: float = 30.0):
+        """
+        :param failure_rate: fraction of failed calls in the window that opens the breaker
+        :param slow_call_duration: Optional seconds after which a call counts as slow
+        :param slow_call_rate: fraction of slow calls in the window that opens the breaker
+        :param window: amount of recent calls considered
+        :param minimum_calls: calls needed in the window before the breaker can open
+        :param open_duration: seconds to refuse requests before probing the provider again
+        """
+        self.failure_rate = failure_rate
+        self.slow_call_duration = slow_call_duration
+        self.slow_call_rate = slow_call_rate
+        self.minimum_calls = minimum_calls
+        self.open_duration = open_duration
+        self._outcomes: Deque[Tuple[bool, bool]] = deque(maxlen=window)  # (failed, slow)
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._probe_started: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.open_duration:
+            self._state = self.HALF_OPEN
+            self._probe_started = None
+        return self._state
+
+    def available(self) -> bool:
+        """Whether allow() would let a request through, without taking the half-open probe"""
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.OPEN:
+            return False
+        # A probe that never reported back (cache hit, cancelled) is given up on after open_duration
+        return self._probe_started is None or time.monotonic() - self._probe_started >= self.open_duration
+
+    def allow(self) -> bool:
+        """Whether a request may be sent now, in the half-open state only one probe is let through at a time"""
+        if not self.available():
+            return False
+        if self._state == self.HALF_OPEN:
+            self._probe_started = time.monotonic()
+        return True
+
+    def _open(self):
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._probe_started = None
+
+    def record(self, duration: float, failed: bool = False):
+        """Record the outcome of a request"""
+        slow = self.slow_call_duration is not None and duration >= self.slow_call_duration
+        state = self.state
+        if state == self.HALF_OPEN:
+            if failed or slow:
+                self._open()
+            else:
+                self._state = self.CLOSED
+                self._outcomes.clear()
+            return
+        if state == self.OPEN:
+            return
+
+        self._outcomes.append((failed, slow))
+        calls = len(self._outcomes)
+        if calls < self.minimum_calls:
+            return
+        failures = sum(outcome[0] for outcome in self._outcomes)
+        slow_calls = sum(outcome[1] for outcome in self._outcomes)
+        if failures / calls >= self.failure_rate or slow_calls / calls >= self.slow_call_rate:
+            self._open()
@@ -0,0 +1,92 @@
+import asyncio
+from typing import Dict, List, Optional, Set, Hashable
+
+from .abc import BaseProvider, Translation
+from .retry import without_deadline
+from .utils import freeze_options
+
+
+class _PendingBatch:
+    __slots__ = ('provider', 'to', 'source', 'options', 'contents', 'futures', 'characters', 'timer')
+
+    def __init__(self, provider: BaseProvider, to: str, source: Optional[str], options: dict):
+        self.provider = provider
+        self.to = to
+        self.source = source
+        self.options = options
+        self.contents: List[str] = []
+        self.futures: List[asyncio.Future] = []
+        self.characters = 0
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
+class Coalescer:
+    """
+    Merges concurrent translate calls into shared provider requests
+    Calls are held for up to `delay` seconds and grouped by (provider, to, source, options). Each group is sent
+    with one translate_batch call, flushing early once the provider's batch limits are reached. Batches are sent
+    without any caller's deadline, each caller's deadline only limits its own wait.
+    """
+
+    def __init__(self, delay: float = 0.005):
+        self.delay = delay
+        self._pending: Dict[Hashable, _PendingBatch] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def translate(self, provider: BaseProvider, content: str, to: str, source: Optional[str] = None,
+                        **options) -> Translation:
+        key = (provider.name.casefold(), to, source or "", freeze_options(options))
+        batch = self._pending.get(key)
+        if batch and provider.max_batch_characters and \
+                batch.characters + len(content) > provider.max_batch_characters:
+            self._flush(key)
+            batch = None
+        if batch is None:
+            batch = self._pending[key] = _PendingBatch(provider, to, source, options)
+            batch.timer = asyncio.get_running_loop().call_later(self.delay, self._flush, key)
+
+        future = asyncio.get_running_loop().create_future()
+        batch.contents.append(content)
+        batch.futures.append(future)
+        batch.characters += len(content)
+        if len(batch.contents) >= provider.max_batch_size:
+            self._flush(key)
+        return await future
+
+    def _flush(self, key: Hashable):
+        batch = self._pending.pop(key, None)
+        if batch is None:
+            return
+        batch.timer.cancel()
+        task = without_deadline(self._send(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    @staticmethod
+    async def _send(batch: _PendingBatch):
+        try:
+            if not batch.provider.throttles_requests:
+                await batch.provider.throttle(batch.characters)
+            translations = await batch.provider.translate_batch(batch.contents, to=batch.to, source=batch.source,
+                                                                **batch.options)
+        except Exception as e:
+            for future in batch.futures:
+                if not future.done():
+                    future.set_exception(e)
+                    # Mark the exception as retrieved, the caller may have stopped waiting before it was raised
+                    future.exception()
+        else:
+            for future, translation in zip(batch.futures, translations):
+                if not future.done():
+                    future.set_result(translation)
+        finally:
+            # Don't leave callers waiting forever if the request itself was cancelled
+            for future in batch.futures:
+                future.cancel()
+
+    async def close(self):
+        """Send all held calls and wait for the in-flight requests to finish"""
+        for key in list(self._pending):
+            self._flush(key)
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
@@ -0,0 +1,203 @@
+import unicodedata
+from abc import ABC, abstractmethod
+from bisect import bisect_right
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+
+class LocalDetector(ABC):
+    """Detects languages without any I/O, results at or above threshold are trusted over provider.detect"""
+    threshold = 0.9
+
+    @abstractmethod
+    def detect(self, content: str) -> Optional[Tuple[str, float]]:
+        """Returns the language code and a confidence between 0 and 1, or None when unsure"""
+        raise NotImplementedError
+
+
+# (first code point, last code point, script), sorted by first code point
+SCRIPT_RANGES = (
+    (0x0370, 0x03FF, 'Greek'),
+    (0x0400, 0x052F, 'Cyrillic'),
+    (0x0530, 0x058F, 'Armenian'),
+    (0x0590, 0x05FF, 'Hebrew'),
+    (0x0600, 0x06FF, 'Arabic'),
+    (0x0750, 0x077F, 'Arabic'),
+    (0x0900, 0x097F, 'Devanagari'),
+    (0x0980, 0x09FF, 'Bengali'),
+    (0x0A00, 0x0A7F, 'Gurmukhi'),
+    (0x0A80, 0x0AFF, 'Gujarati'),
+    (0x0B00, 0x0B7F, 'Oriya'),
+    (0x0B80, 0x0BFF, 'Tamil'),
+    (0x0C00, 0x0C7F, 'Telugu'),
+    (0x0C80, 0x0CFF, 'Kannada'),
+    (0x0D00, 0x0D7F, 'Malayalam'),
+    (0x0D80, 0x0DFF, 'Sinhala'),
+    (0x0E00, 0x0E7F, 'Thai'),
+    (0x0E80, 0x0EFF, 'Lao'),
+    (0x0F00, 0x0FFF, 'Tibetan'),
+    (0x1000, 0x109F, 'Myanmar'),
+    (0x10A0, 0x10FF, 'Georgian'),
+    (0x1100, 0x11FF, 'Hangul'),
+    (0x1200, 0x137F, 'Ethiopic'),
+    (0x1780, 0x17FF, 'Khmer'),
+    (0x3040, 0x309F, 'Kana'),
+    (0x30A0, 0x30FF, 'Kana'),
+    (0x3130, 0x318F, 'Hangul'),
+    (0x3400, 0x4DBF, 'Han'),
+    (0x4E00, 0x9FFF, 'Han'),
+    (0xAC00, 0xD7AF, 'Hangul'),
+)
+_RANGE_STARTS = [start for start, _, _ in SCRIPT_RANGES]
+
+# Scripts used by a single language, (language, confidence)
+SCRIPT_LANGUAGES = {
+    'Greek': ('el', 1.0),
+    'Armenian': ('hy', 1.0),
+    'Hebrew': ('he', 0.95),
+    'Devanagari': ('hi', 0.7),  # Also Marathi, Nepali, Sanskrit
+    'Bengali': ('bn', 0.9),
+    'Gurmukhi': ('pa', 1.0),
+    'Gujarati': ('gu', 1.0),
+    'Oriya': ('or', 1.0),
+    'Tamil': ('ta', 1.0),
+    'Telugu': ('te', 1.0),
+    'Kannada': ('kn', 1.0),
+    'Malayalam': ('ml', 1.0),
+    'Sinhala': ('si', 1.0),
+    'Thai': ('th', 1.0),
+    'Lao': ('lo', 1.0),
+    'Tibetan': ('bo', 0.95),
+    'Myanmar': ('my', 1.0),
+    'Georgian': ('ka', 1.0),
+    'Hangul': ('ko', 1.0),
+    'Ethiopic': ('am', 0.8),  # Also Tigrinya
+    'Khmer': ('km', 1.0),
+    'Kana': ('ja', 1.0),
+}
+
+# Letters that single out a language among those sharing a script, checked in order
+CYRILLIC_MARKERS = (
+    ('uk', set('їєґЇЄҐ')),
+    ('be', set('ўЎ')),
+    ('sr', set('ђћЂЋ')),
+    ('mk', set('ѓќѕЃЌЅ')),
+    ('kk', set('әғқұһӘҒҚҰҺ')),
+)
+RUSSIAN_MARKERS = set('ыэёЫЭЁ')
+ARABIC_MARKERS = (
+    ('ur', set('ٹڈڑںےۓ')),
+    ('fa', set('پچژگکی')),
+    ('ar', set('ةيى')),
+)
+
+
+def script(character: str) -> Optional[str]:
+    code_point = ord(character)
+    index = bisect_right(_RANGE_STARTS, code_point) - 1
+    if index >= 0 and code_point <= SCRIPT_RANGES[index][1]:
+        return SCRIPT_RANGES[index][2]
+    return None
+
+
+class ScriptDetector(LocalDetector):
+    """
+    Resolves languages from their writing system, such as Korean, Japanese, Thai, Greek, Russian or Arabic
+    Latin script and Chinese characters without kana are left to the provider.
+    """
+
+    def __init__(self, threshold: float = 0.9, min_letters: int = 2, sample: int = 200):
+        """
+        :param threshold: confidence needed for a result to be trusted
+        :param min_letters: letters needed before guessing
+        :param sample: characters looked at, from the start of the content
+        """
+        self.threshold = threshold
+        self.min_letters = min_letters
+        self.sample = sample
+
+    def detect(self, content: str) -> Optional[Tuple[str, float]]:
+        text = content[:self.sample]
+        scripts: Counter = Counter(script(character) for character in text if character.isalpha())
+        letters = sum(scripts.values())
+        if letters < self.min_letters:
+            return None
+        (dominant, count), = scripts.most_common(1)
+        share = count / letters
+
+        if scripts['Kana'] and dominant in ('Han', 'Kana'):
+            # Japanese mixes kana with kanji
+            return 'ja', (scripts['Kana'] + scripts['Han']) / letters
+        if dominant == 'Cyrillic':
+            language, confidence = self._cyrillic(text)
+        elif dominant == 'Arabic':
+            language, confidence = self._marked(text, ARABIC_MARKERS, ('ar', 0.75))
+        elif dominant in SCRIPT_LANGUAGES:
+            language, confidence = SCRIPT_LANGUAGES[dominant]
+        else:
+            return None
+        return language, share * confidence
+
+    @classmethod
+    def _cyrillic(cls, text: str) -> Tuple[str, float]:
+        language, confidence = cls._marked(text, CYRILLIC_MARKERS, ('ru', 0.75))
+        if language == 'ru' and not RUSSIAN_MARKERS.isdisjoint(text):
+            return 'ru', 0.95
+        return language, confidence
+
+    @staticmethod
+    def _marked(text: str, markers, default: Tuple[str, float]) -> Tuple[str, float]:
+        characters = set(text)
+        for language, letters in markers:
+            if not letters.isdisjoint(characters):
+                return language, 0.95
+        return default
+
+
+class DetectionCache:
+    """
+    Compact LRU cache of detected languages
+    Entries are keyed by a hash of the provider and normalized content and store a small integer id of the language,
+    so an entry costs a couple of ints however long the content is.
+    """
+
+    def __init__(self, maxsize: int = 100000):
+        self.maxsize = maxsize
+        self._store: "OrderedDict[int, int]" = OrderedDict()  # {content_hash: language_id}
+        self._languages: List[str] = []
+        self._language_ids: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._store)
+
+    @staticmethod
+    def key(provider_name: str, content: str) -> int:
+        return hash((provider_name, " ".join(unicodedata.normalize('NFC', content).casefold().split())))
+
+    def get(self, provider_name: str, content: str) -> Optional[str]:
+        key = self.key(provider_name, content)
+        language_id = self._store.get(key)
+        if language_id is None:
+            self.misses += 1
+            return None
+        self._store.move_to_end(key)
+        self.hits += 1
+        return self._languages[language_id]
+
+    def set(self, provider_name: str, content: str, language: str):
+        language_id = self._language_ids.get(language)
+        if language_id is None:
+            language_id = self._language_ids[language] = len(self._languages)
+            self._languages.append(language)
+        key = self.key(provider_name, content)
+        self._store[key] = language_id
+        self._store.move_to_end(key)
+        if len(self._store) > self.maxsize:
+            self._store.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._store.clear()
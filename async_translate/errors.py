@@ -30,6 +30,11 @@ class ProviderUnavailable(TranslatorException):
         self.source_language = source_language
 
 
+class DeadlineExceeded(TranslatorException):
+    def __init__(self):
+        super().__init__("The deadline passed before the provider answered.")
+
+
 class DetectedAsSameError(TranslatorException):
     def __init__(self, to_language, detected_language):
         super().__init__()
@@ -0,0 +1,48 @@
+from typing import Optional
+
+from . import serializers
+
+
+class SessionManager:
+    """
+    Owns one aiohttp session and connection pool that providers borrow instead of creating their own
+    Share one manager between AsyncTranslate instances (e.g. shards) so they also share sockets and DNS lookups.
+    aiohttp is only imported once a session is needed, so providers without HTTP don't require it.
+    """
+
+    def __init__(self, limit: int = 100, limit_per_host: int = 0, keepalive_timeout: float = 30.0,
+                 ttl_dns_cache: Optional[int] = 300, enable_cleanup_closed: bool = False):
+        """
+        :param limit: maximum connections in total, 0 for no limit
+        :param limit_per_host: maximum connections to a single host, 0 for no limit
+        :param keepalive_timeout: seconds idle connections are kept open for reuse
+        :param ttl_dns_cache: Optional seconds DNS results are cached for, None caches them forever
+        :param enable_cleanup_closed: clean up SSL transports the remote didn't close properly
+        """
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.ttl_dns_cache = ttl_dns_cache
+        self.enable_cleanup_closed = enable_cleanup_closed
+        self._session = None
+
+    @property
+    def closed(self) -> bool:
+        return self._session is None or self._session.closed
+
+    async def session(self):
+        """Returns the shared aiohttp.ClientSession, creating it on first use"""
+        if self.closed:
+            import aiohttp
+
+            connector = aiohttp.TCPConnector(limit=self.limit, limit_per_host=self.limit_per_host,
+                                             keepalive_timeout=self.keepalive_timeout, use_dns_cache=True,
+                                             ttl_dns_cache=self.ttl_dns_cache,
+                                             enable_cleanup_closed=self.enable_cleanup_closed)
+            self._session = aiohttp.ClientSession(connector=connector, json_serialize=serializers.dumps_str)
+        return self._session
+
+    async def close(self):
+        if not self.closed:
+            await self._session.close()
+        self._session = None
@@ -1,15 +1,18 @@
+import asyncio
 import uuid
-from json import JSONDecodeError
 from typing import Dict, Optional, Union, Sequence, List, Any
 
-from aiohttp_retry import RetryClient, ExponentialRetry
+import aiohttp
 
 from async_translate.abc import BaseProvider, Translation
-from async_translate.errors import TranslatorException, LanguageNotSupported
-from async_translate.providers.azure.errors import NoAPIKeys, AllKeysExhausted, RequestException
+from async_translate.errors import TranslatorException, LanguageNotSupported, DeadlineExceeded
+from async_translate import serializers
+from async_translate.http import SessionManager
+from async_translate.providers.azure.errors import AllKeysExhausted, RequestException
+from async_translate.providers.azure.keypool import KeyPool
+from async_translate.retry import remaining, retry_budget, retry_delay, parse_retry_after
 
 MS_API_VER = "?api-version=3.0"
-retry_options = ExponentialRetry(attempts=10, start_timeout=8.0, factor=1.3, statuses={429})
 
 
 class Azure(BaseProvider):
@@ -19,78 +22,147 @@ class Azure(BaseProvider):
     backend = "azure"
     ms_endpoint = "https://api.cognitive.microsofttranslator.com/"
     icon = "https://connectoricons-prod.azureedge.net/microsofttranslator/icon_1.0.1303.1871.png"
-
-    def __init__(self, api_keys: Union[str, Sequence[str]]):
+    max_characters = 50000
+    max_batch_size = 1000
+    max_batch_characters = 50000
+    detects_inline = True
+    throttles_requests = True
+    max_attempts = 5  # Attempts per request, also limited by the deadline and the process wide retry budget
+
+    def __init__(self, api_keys: Union[str, Sequence[str]], key_weights: Optional[Sequence[float]] = None,
+                 key_quota: Optional[int] = None, key_requests_per_second: Optional[float] = None,
+                 key_characters_per_second: Optional[float] = None):
+        """
+        :param api_keys: one or more API keys, requests are spread over all of them
+        :param key_weights: Optional relative share of requests for each key
+        :param key_quota: Optional characters each key may translate, to stop using keys before Azure rejects them
+        :param key_requests_per_second: Optional request rate limit for each key
+        :param key_characters_per_second: Optional character rate limit for each key
+        """
         if isinstance(api_keys, str):
-            self._api_keys: List[str] = [api_keys]
-        else:
-            if len(api_keys) < 1:
-                raise NoAPIKeys("No API keys provided")
-            self._api_keys: Sequence[str] = api_keys
-        self.api_iter = iter(self._api_keys)
-        self.current_key = next(self.api_iter)
-        self.session: Optional[RetryClient] = None
-
-    @property
-    def headers(self):
+            api_keys = [api_keys]
+        self.keys = KeyPool(api_keys, weights=key_weights, quota=key_quota,
+                            requests_per_second=key_requests_per_second,
+                            characters_per_second=key_characters_per_second)
+        self._owns_session_manager = False
+
+    async def _session(self) -> aiohttp.ClientSession:
+        """Borrow the shared session, creating a private pool when used without AsyncTranslate"""
+        if self.session_manager is None:
+            self.session_manager = SessionManager()
+            self._owns_session_manager = True
+        return await self.session_manager.session()
+
+    @staticmethod
+    def _headers(api_key: str):
         return {
-            'Ocp-Apim-Subscription-Key': self.current_key,
+            'Ocp-Apim-Subscription-Key': api_key,
             'Content-type': 'application/json',
             'X-ClientTraceId': str(uuid.uuid4())
         }
 
     async def _request(self, endpoint, method='post', params: Optional[Dict] = None, json: Any = None,
                        api_key_override: Optional[str] = None):
-        if params is None:
-            params = {}
-
-        headers = self.headers
-
-        if api_key_override:
-            headers['Ocp-Apim-Subscription-Key'] = api_key_override
-
-        if accept_language := params.pop('accept_language', None):
-            headers['Accept-Language'] = accept_language
+        params = dict(params or {})
+        accept_language = params.pop('accept_language', None)
+        characters = sum(len(entry['text']) for entry in json) if json else 0
         url = self.ms_endpoint + endpoint + MS_API_VER + "&"
-        async with self.session.request(method=method, url=url, params=params, headers=headers, json=json) as resp:
-            try:
-                data = await resp.json(content_type=None)
+        body = serializers.dumps(json) if json is not None else None
+
+        session = await self._session()
+        retry_budget.request()
+        attempt = 0
+        while True:
+            attempt += 1
+            await self.throttle(characters)
+            key_state = None
+            if not api_key_override:
                 try:
-                    if error := data.get('error'):
-                        # Handle Free Quota Errors
-                        if error['code'] in (401000, 403000, 403001, 429000, 429001, 429002):
-                            try:
-                                self.current_key = next(self.api_iter)
-                            except StopIteration:
-                                self.api_iter = iter(self._api_keys)
-                                self.current_key = next(self.api_iter)
-                                full_stop = True
-                            else:
-                                return await self._request(endpoint, method, params, json)
-                            if full_stop:
-                                raise AllKeysExhausted("All API Keys Exhausted", error)
-                        else:  # Handle Generic Errors
-                            raise RequestException(error, **error)
-                except AttributeError:
-                    pass
+                    key_state = self.keys.acquire(characters)
+                except AllKeysExhausted:
+                    # Wait for the first throttled key to cool down, if the deadline and retry budget allow it
+                    # Keys that are out of quota or rejected won't recover within a request, so those fail right away
+                    if (next_available_in := self.keys.next_available_in()) is None:
+                        raise
+                    if (delay := retry_delay(attempt, self.max_attempts, next_available_in)) is None:
+                        raise
+                    await asyncio.sleep(delay)
+                    continue
+                if key_state.limiter:
+                    await key_state.limiter.acquire(characters)
+
+            headers = self._headers(api_key_override or key_state.key)
+            if accept_language:
+                headers['Accept-Language'] = accept_language
+
+            # Each attempt may only use what is left of the deadline
+            kwargs = {}
+            if (time_left := remaining()) is not None:
+                if time_left <= 0:
+                    raise DeadlineExceeded()
+                kwargs['timeout'] = aiohttp.ClientTimeout(total=time_left)
+
+            try:
+                async with session.request(method=method, url=url, params=params, headers=headers, data=body,
+                                                **kwargs) as resp:
+                    retry_after = parse_retry_after(resp.headers.get('Retry-After'))
+                    try:
+                        data = serializers.loads(await resp.read())
+                    except serializers.JSONDecodeError as e:
+                        if resp.status < 500:
+                            raise TranslatorException(await resp.text()) from e
+                        data = None
+                    status = resp.status
+                    metered_usage = int(resp.headers.get('X-metered-usage', 0))
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if remaining() == 0:
+                    raise DeadlineExceeded() from e
+                if key_state:
+                    self.keys.failed(key_state)
+                if (delay := retry_delay(attempt, self.max_attempts)) is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+
+            error = data.get('error') if isinstance(data, dict) else None
+            if not error and status < 500:
+                if key_state:
+                    self.keys.success(key_state, metered_usage)
                 return data
-            except JSONDecodeError as e:
-                raise TranslatorException(await resp.text()) from e
 
-    async def get_languages(self, locale=None, *args, **kwargs) -> Dict[str, str]:
-        # Setup retry client
-        if not self.session:
-            self.session = RetryClient(retry_options=retry_options)
+            code = error['code'] if error else status * 1000
+            if key_state and code in (429000, 429001, 429002):  # Rate limited, try again with another key
+                self.keys.throttled(key_state, retry_after)
+                switch_key = True
+            elif key_state and code in (401000, 403000, 403001):  # Free quota exhausted or key rejected
+                self.keys.exhausted(key_state)
+                switch_key = True
+            else:
+                switch_key = False
+                if key_state:
+                    self.keys.failed(key_state)
+
+            if switch_key:
+                # Another key can be used right away, but switching still counts as an attempt
+                if retry_delay(attempt, self.max_attempts, 0.0) is not None:
+                    continue
+            elif code // 1000 == 429 or status >= 500:  # Throttled override key or server error
+                if (delay := retry_delay(attempt, self.max_attempts, retry_after)) is not None:
+                    await asyncio.sleep(delay)
+                    continue
+            if error:
+                raise RequestException(error, **error)
+            raise TranslatorException(f"Azure responded with HTTP {status}")
 
+    async def get_languages(self, locale=None, *args, **kwargs) -> Dict[str, str]:
         raw_languages = await self._request('languages', 'get',
                                             {'scope': 'translation', 'accept_language': locale})
         return {key: value['name'] for key, value in raw_languages['translation'].items()}
 
     async def close(self):
-        # noinspection PyProtectedMember
-        if self.session._closed:
-            return
-        await self.session.close()
+        # A borrowed pool is closed by its owner
+        if self._owns_session_manager:
+            await self.session_manager.close()
 
     async def detect(self, content, key_override: Optional[str] = None) -> str:
         """Detect the language of the given content"""
@@ -106,6 +178,16 @@ class Azure(BaseProvider):
         :param source: Optional language to translate from
         :return: the translation
         """
+        return (await self.translate_batch([content], to=to, source=source, **options))[0]
+
+    async def translate_batch(self, contents: Sequence[str], to: str, source="", **options) -> List[Translation]:
+        """
+        Translates multiple texts in one request using the Azure API
+        :param contents: the texts to translate, at most max_batch_size of them
+        :param to: the language code to translate to
+        :param source: Optional language to translate from
+        :return: the translations, in the same order as contents
+        """
         params = {
             'to': to,
             'profanityAction': ('NoAction', 'Marked', 'Marked')[options.get('profanity_filter') or 0]
@@ -116,7 +198,7 @@ class Azure(BaseProvider):
         if params['profanityAction'] == 1:
             params['profanityMarker'] = 'Tag'
 
-        json_content = [{"text": content}]
+        json_content = [{"text": content} for content in contents]
         try:
             translation_response = (await self._request('translate', params=params, json=json_content))
         except RequestException as te:
@@ -130,9 +212,11 @@ class Azure(BaseProvider):
                 raise LanguageNotSupported(language=language, direction=direction) from te
             raise
 
-        entry = translation_response[0]
-        return Translation(
-            text=entry['translations'][0]['text'],
-            to=entry['translations'][0]['to'],
-            source=entry.get('detectedLanguage', {}).get('language')
-        )
+        return [
+            Translation(
+                text=entry['translations'][0]['text'],
+                to=entry['translations'][0]['to'],
+                source=entry.get('detectedLanguage', {}).get('language')
+            )
+            for entry in translation_response
+        ]
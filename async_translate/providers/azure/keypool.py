@@ -0,0 +1,142 @@
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+
+from async_translate.providers.azure.errors import NoAPIKeys, AllKeysExhausted
+from async_translate.ratelimit import RateLimiter
+
+
+@dataclass
+class KeyState:
+    """Health and usage of a single API key"""
+    key: str
+    weight: float = 1.0
+    cooldown_until: float = 0.0  # time.monotonic() until which the key isn't used
+    exhausted_until: float = 0.0  # time.monotonic() until which the key is out of quota or rejected
+    last_throttled: float = 0.0
+    remaining_quota: Optional[int] = None  # Estimated characters left, None when unknown
+    requests: int = 0
+    characters: int = 0
+    throttles: int = 0
+    errors: int = 0
+    limiter: Optional[RateLimiter] = None
+    _current_weight: float = 0.0
+
+    def available(self, now: float) -> bool:
+        return self.cooldown_until <= now and (self.remaining_quota is None or self.remaining_quota > 0)
+
+
+class KeyPool:
+    """
+    Hands out API keys using smooth weighted round-robin over the keys that aren't cooling down
+    Safe to share between any amount of concurrent requests, as picking a key never awaits.
+    """
+
+    def __init__(self, keys: Sequence[str], weights: Optional[Sequence[float]] = None,
+                 quota: Optional[int] = None, throttle_cooldown: float = 10.0, min_throttle_cooldown: float = 1.0,
+                 quota_cooldown: float = 3600.0, requests_per_second: Optional[float] = None,
+                 characters_per_second: Optional[float] = None):
+        """
+        :param keys: the API keys
+        :param weights: Optional relative share of requests for each key, for keys on different pricing tiers
+        :param quota: Optional characters each key may translate, used to estimate the remaining quota
+        :param throttle_cooldown: seconds a key rests after a 429 without a Retry-After header
+        :param min_throttle_cooldown: seconds a key rests at least after a 429, even if Retry-After is shorter
+        :param quota_cooldown: seconds a key rests after its quota is exhausted or it is rejected
+        :param requests_per_second: Optional request rate limit for each key
+        :param characters_per_second: Optional character rate limit for each key
+        """
+        if len(keys) < 1:
+            raise NoAPIKeys("No API keys provided")
+        weights = weights or [1.0] * len(keys)
+        limited = requests_per_second or characters_per_second
+        self._states: List[KeyState] = [
+            KeyState(key=key, weight=weight, remaining_quota=quota,
+                     limiter=RateLimiter(requests_per_second, characters_per_second) if limited else None)
+            for key, weight in zip(keys, weights)
+        ]
+        self._by_key: Dict[str, KeyState] = {state.key: state for state in self._states}
+        self.throttle_cooldown = throttle_cooldown
+        self.min_throttle_cooldown = min_throttle_cooldown
+        self.quota_cooldown = quota_cooldown
+
+    def __len__(self):
+        return len(self._states)
+
+    def __getitem__(self, key: str) -> KeyState:
+        return self._by_key[key]
+
+    @property
+    def states(self) -> Sequence[KeyState]:
+        return tuple(self._states)
+
+    def available(self) -> List[KeyState]:
+        now = time.monotonic()
+        return [state for state in self._states if state.available(now)]
+
+    def acquire(self, characters: int = 0) -> KeyState:
+        """
+        Pick the next key to use, raising AllKeysExhausted when every key is cooling down or out of quota
+        Keys whose rate limiter could send the request right away are preferred, otherwise the key with the shortest
+        wait is used. The caller waits on the returned key's limiter before sending.
+        """
+        available = self.available()
+        if not available:
+            raise AllKeysExhausted("All API Keys Exhausted")
+        if any(state.limiter for state in available):
+            delays = [state.limiter.delay(characters) if state.limiter else 0.0 for state in available]
+            shortest = min(delays)
+            available = [state for state, delay in zip(available, delays) if delay <= shortest]
+
+        total = 0.0
+        best = available[0]
+        for state in available:
+            state._current_weight += state.weight
+            total += state.weight
+            # Prefer keys that were throttled least recently when weights tie
+            if (state._current_weight, -state.last_throttled) > (best._current_weight, -best.last_throttled):
+                best = state
+        best._current_weight -= total
+        return best
+
+    def next_available_in(self) -> Optional[float]:
+        """Seconds until a throttled key can be used again, None when every key is out of quota or rejected"""
+        now = time.monotonic()
+        cooldowns = [state.cooldown_until for state in self._states
+                     if state.exhausted_until <= now and (state.remaining_quota is None or state.remaining_quota > 0)]
+        if not cooldowns:
+            return None
+        return max(min(cooldowns) - now, 0.0)
+
+    @staticmethod
+    def success(state: KeyState, characters: int = 0):
+        state.requests += 1
+        state.characters += characters
+        if state.remaining_quota is not None:
+            state.remaining_quota = max(state.remaining_quota - characters, 0)
+
+    def throttled(self, state: KeyState, retry_after: Optional[float] = None):
+        """The key was rate limited (429)"""
+        now = time.monotonic()
+        state.throttles += 1
+        state.last_throttled = now
+        cooldown = retry_after if retry_after is not None else self.throttle_cooldown
+        state.cooldown_until = max(state.cooldown_until, now + max(cooldown, self.min_throttle_cooldown))
+
+    def exhausted(self, state: KeyState):
+        """The key ran out of quota or was rejected (401/403)"""
+        now = time.monotonic()
+        state.throttles += 1
+        state.last_throttled = now
+        state.exhausted_until = now + self.quota_cooldown
+        state.cooldown_until = max(state.cooldown_until, state.exhausted_until)
+
+    def reset_quota(self, quota: Optional[int]):
+        """Start a new quota period, for example at the start of each billing month"""
+        for state in self._states:
+            state.remaining_quota = quota
+
+    @staticmethod
+    def failed(state: KeyState):
+        """The request failed for a reason unrelated to the key's limits"""
+        state.errors += 1
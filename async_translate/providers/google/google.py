@@ -1,15 +1,20 @@
 import os
-from typing import Dict
+from typing import Dict, List, Sequence
 
-from aiocache import cached
 from google.cloud.translate_v3.services.translation_service.async_client import TranslationServiceAsyncClient
 
-from async_translate.abc import BaseProvider, ONE_DAY, Translation
+from async_translate.abc import BaseProvider, Translation
 from async_translate.errors import TranslatorException
+from async_translate.retry import remaining
 
 
 class Google(BaseProvider):
     icon = "https://i.imgur.com/jDPXiQh.png"
+    max_characters = 30000
+    max_batch_size = 1024
+    max_batch_characters = 30000
+    detects_inline = True
+    throttles_requests = True
 
     def __init__(self, credentials=None, parent: str = None):
         """
@@ -26,8 +31,14 @@ class Google(BaseProvider):
             raise TranslatorException("Please set/export the 'GOOGLE_TRANSLATE_PARENT' environment variable. "
                                       "Ex: 'projects/mr-translate-1577912381600/locations/global'")
 
-    @cached(ttl=ONE_DAY)
+    @staticmethod
+    def _timeout() -> Dict[str, float]:
+        """Limit a request to what is left of the current deadline"""
+        time_left = remaining()
+        return {} if time_left is None else {'timeout': time_left}
+
     async def get_languages(self, locale="en") -> Dict[str, str]:
+        await self.throttle()
         return {
             lang.language_code: lang.display_name
             for lang in filter(
@@ -36,7 +47,9 @@ class Google(BaseProvider):
         }
 
     async def detect(self, content) -> str:
-        res = (await self.client.detect_language(parent=self.parent, content=content)).languages[0]
+        await self.throttle(len(content))
+        res = (await self.client.detect_language(parent=self.parent, content=content,
+                                                 **self._timeout())).languages[0]
         return res.language_code
 
     async def translate(self, content: str, to: str, source="", **options) -> Translation:
@@ -47,17 +60,31 @@ class Google(BaseProvider):
         :param source: Optional language to translate from
         :return: the translation
         """
-        params = {"contents": [content],
+        return (await self.translate_batch([content], to=to, source=source, **options))[0]
+
+    async def translate_batch(self, contents: Sequence[str], to: str, source="", **options) -> List[Translation]:
+        """
+        Translates multiple texts in one request using the Google API
+        :param contents: the texts to translate, at most max_batch_size of them
+        :param to: the language code to translate to
+        :param source: Optional language to translate from
+        :return: the translations, in the same order as contents
+        """
+        params = {"contents": list(contents),
                   "target_language_code": to,
                   "parent": self.parent,
                   'mime_type': 'text/plain'}
         if source:
             params['source_language_code'] = source
 
-        translation = (await self.client.translate_text(**params)).translations[0]
-        return Translation(
-            # text=unescape(translation.translated_text),
-            text=translation.translated_text,
-            to=to,
-            source=translation.detected_language_code or None
-        )
+        await self.throttle(sum(map(len, contents)))
+        translations = (await self.client.translate_text(**params, **self._timeout())).translations
+        return [
+            Translation(
+                # text=unescape(translation.translated_text),
+                text=translation.translated_text,
+                to=to,
+                source=translation.detected_language_code or None
+            )
+            for translation in translations
+        ]
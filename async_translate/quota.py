@@ -0,0 +1,171 @@
+import asyncio
+import threading
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Dict, Hashable, List, Mapping, Optional, Tuple
+
+from .errors import NotEnoughCharacters
+
+Account = Tuple[Hashable, str]  # (tenant, provider_name)
+
+
+class QuotaBackend(ABC):
+    """Persistent storage of character balances, such as a database table"""
+
+    @abstractmethod
+    async def load(self, tenant: Hashable, provider: str) -> int:
+        """Returns the characters the tenant has left for the provider"""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def apply(self, deltas: Mapping[Account, int]):
+        """Add the deltas, negative for usage, to the stored balances in one batch"""
+        raise NotImplementedError
+
+
+@dataclass
+class Reservation:
+    tenant: Hashable
+    provider: str
+    characters: int
+    settled: bool = False
+
+
+class _Shard:
+    __slots__ = ('lock', 'balances', 'deltas')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.balances: Dict[Account, int] = {}
+        self.deltas: Dict[Account, int] = {}
+
+
+class QuotaLedger:
+    """
+    Tracks characters left per tenant and provider in memory
+    Characters are reserved before a translation and committed or refunded afterwards, so concurrent translations
+    can't overspend. Usage is written to the optional backend in batches by flush(), periodically once started.
+    """
+
+    def __init__(self, backend: Optional[QuotaBackend] = None, default_balance: int = 0, shards: int = 16,
+                 flush_interval: float = 5.0):
+        """
+        :param backend: Optional persistent storage, balances are loaded from it the first time a tenant is seen
+        :param default_balance: characters of tenants without a backend balance
+        :param shards: amount of independently locked partitions of the balances
+        :param flush_interval: seconds between flushes to the backend once started
+        """
+        self.backend = backend
+        self.default_balance = default_balance
+        self.flush_interval = flush_interval
+        self._shards: List[_Shard] = [_Shard() for _ in range(max(shards, 1))]
+        self._flusher: Optional[asyncio.Task] = None
+
+    def _shard(self, account: Account) -> _Shard:
+        return self._shards[hash(account) % len(self._shards)]
+
+    def balance(self, tenant: Hashable, provider: str) -> Optional[int]:
+        """Characters left, None when the tenant hasn't been loaded yet"""
+        account = (tenant, provider)
+        return self._shard(account).balances.get(account)
+
+    def set_balance(self, tenant: Hashable, provider: str, characters: int):
+        """Overwrite the in-memory balance, e.g. after a purchase already stored in the backend"""
+        account = (tenant, provider)
+        shard = self._shard(account)
+        with shard.lock:
+            shard.balances[account] = characters
+
+    def grant(self, tenant: Hashable, provider: str, characters: int):
+        """Add characters to the balance, the change is also written to the backend"""
+        self._change((tenant, provider), characters)
+
+    def _change(self, account: Account, characters: int, persist: bool = True):
+        shard = self._shard(account)
+        with shard.lock:
+            shard.balances[account] = shard.balances.get(account, self.default_balance) + characters
+            if persist:
+                shard.deltas[account] = shard.deltas.get(account, 0) + characters
+
+    async def _ensure_loaded(self, account: Account):
+        shard = self._shard(account)
+        if account in shard.balances:
+            return
+        balance = await self.backend.load(*account) if self.backend else self.default_balance
+        with shard.lock:
+            shard.balances.setdefault(account, balance)
+
+    async def reserve(self, tenant: Hashable, provider: str, characters: int) -> Reservation:
+        """Hold characters for a translation, raising NotEnoughCharacters when the balance is too low"""
+        account = (tenant, provider)
+        await self._ensure_loaded(account)
+        shard = self._shard(account)
+        with shard.lock:
+            balance = shard.balances[account]
+            if balance < characters:
+                raise NotEnoughCharacters(provider, characters=balance, content_length=characters, server_id=tenant)
+            shard.balances[account] = balance - characters
+        return Reservation(tenant, provider, characters)
+
+    def commit(self, reservation: Reservation, used: Optional[int] = None):
+        """Charge a reservation, refunding the part that wasn't used"""
+        if reservation.settled:
+            return
+        reservation.settled = True
+        used = reservation.characters if used is None else min(used, reservation.characters)
+        account = (reservation.tenant, reservation.provider)
+        shard = self._shard(account)
+        with shard.lock:
+            shard.balances[account] += reservation.characters - used
+            shard.deltas[account] = shard.deltas.get(account, 0) - used
+
+    def refund(self, reservation: Reservation):
+        """Release a reservation without charging it"""
+        if reservation.settled:
+            return
+        reservation.settled = True
+        self._change((reservation.tenant, reservation.provider), reservation.characters, persist=False)
+
+    async def flush(self):
+        """Write the usage since the last flush to the backend"""
+        deltas: Dict[Account, int] = {}
+        for shard in self._shards:
+            with shard.lock:
+                deltas.update(shard.deltas)
+                shard.deltas = {}
+        deltas = {account: delta for account, delta in deltas.items() if delta}
+        if not deltas or not self.backend:
+            return
+        try:
+            await self.backend.apply(deltas)
+        except BaseException:
+            # Keep the usage for the next flush
+            for account, delta in deltas.items():
+                shard = self._shard(account)
+                with shard.lock:
+                    shard.deltas[account] = shard.deltas.get(account, 0) + delta
+            raise
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                pass  # Retried on the next flush
+
+    def start(self):
+        """Start flushing to the backend every flush_interval seconds"""
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.ensure_future(self._flush_periodically())
+
+    async def close(self):
+        """Stop flushing periodically and write the remaining usage"""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        await self.flush()
@@ -0,0 +1,101 @@
+import asyncio
+import time
+from typing import Optional
+
+
+class TokenBucket:
+    """
+    Token bucket that queues callers in FIFO order until enough tokens are available
+    Requests larger than the capacity are let through once the bucket is full, leaving it in debt.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        """
+        :param rate: tokens added per second
+        :param capacity: Optional maximum tokens stored for bursts, defaults to one second worth of tokens
+        """
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock: Optional[asyncio.Lock] = None  # Created on first use, so it binds to the running loop
+        self.waiting = 0  # Callers queued for tokens
+        self.acquired = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    @property
+    def tokens(self) -> float:
+        self._refill()
+        return self._tokens
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self._tokens + (now - self._updated) * self.rate, self.capacity)
+        self._updated = now
+
+    def delay(self, amount: float = 1) -> float:
+        """Seconds until amount tokens could be taken, ignoring callers already queued"""
+        return max(min(amount, self.capacity) - self.tokens, 0.0) / self.rate
+
+    async def acquire(self, amount: float = 1):
+        start = time.monotonic()
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        self.waiting += 1
+        try:
+            async with self._lock:
+                while (delay := self.delay(amount)) > 0:
+                    await asyncio.sleep(delay)
+                self._tokens -= amount
+        finally:
+            self.waiting -= 1
+        waited = time.monotonic() - start
+        self.acquired += 1
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+
+
+class RateLimiter:
+    """Limits requests and characters per second, queueing callers fairly instead of letting them fail upstream"""
+
+    def __init__(self, requests_per_second: Optional[float] = None, characters_per_second: Optional[float] = None,
+                 burst: float = 1.0):
+        """
+        :param requests_per_second: Optional maximum requests per second
+        :param characters_per_second: Optional maximum characters per second
+        :param burst: seconds worth of requests and characters that may be sent at once
+        """
+        self.requests = TokenBucket(requests_per_second, requests_per_second * burst) \
+            if requests_per_second else None
+        self.characters = TokenBucket(characters_per_second, characters_per_second * burst) \
+            if characters_per_second else None
+        self.queue_depth = 0  # Callers currently waiting
+        self.acquired = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    @property
+    def average_wait(self) -> float:
+        """Average seconds callers waited"""
+        return self.total_wait / self.acquired if self.acquired else 0.0
+
+    def delay(self, characters: int = 0) -> float:
+        """Seconds until a request of this size could be sent, ignoring callers already queued"""
+        return max(self.requests.delay() if self.requests else 0.0,
+                   self.characters.delay(characters) if self.characters and characters else 0.0)
+
+    async def acquire(self, characters: int = 0):
+        start = time.monotonic()
+        self.queue_depth += 1
+        try:
+            if self.requests:
+                await self.requests.acquire()
+            if self.characters and characters:
+                await self.characters.acquire(characters)
+        finally:
+            self.queue_depth -= 1
+        waited = time.monotonic() - start
+        self.acquired += 1
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
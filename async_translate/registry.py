@@ -0,0 +1,84 @@
+from types import MappingProxyType
+from typing import Dict, FrozenSet, Iterable, Mapping, Optional, Set, Tuple
+
+from .caseinsensitivedict import FrozenCaseInsensitiveDict
+from .resolver import LanguageResolver
+
+
+class LanguageIndex:
+    """
+    Lookups over a registry's languages, built once per registry and shared read-only
+    Codes and names resolve case-insensitively, and the providers of each language are a bitset so support checks
+    are a single AND.
+    """
+    __slots__ = ('providers', 'provider_bits', 'language_bits', 'names', 'codes', '_codes')
+
+    def __init__(self, languages: Mapping[str, FrozenSet[str]], names: Mapping[str, str], order: Iterable[str]):
+        self.providers: Tuple[str, ...] = tuple(order)  # Provider of each bit
+        self.provider_bits: Mapping[str, int] = MappingProxyType(
+            {provider_name: 1 << bit for bit, provider_name in enumerate(self.providers)})
+        self.language_bits: Mapping[str, int] = MappingProxyType({
+            code: sum(self.provider_bits[provider_name] for provider_name in provider_names)
+            for code, provider_names in languages.items()
+        })
+        self.names = FrozenCaseInsensitiveDict(names)  # {'en': 'English'}
+        self.codes = FrozenCaseInsensitiveDict({name: code for code, name in names.items()})  # {'English': 'en'}
+        self._codes: Mapping[str, str] = MappingProxyType({code.casefold(): code for code in names})
+
+    def code(self, language: str) -> Optional[str]:
+        """Code of a language given its code or English name in any case, None when unknown"""
+        code = self._codes.get(language.casefold())
+        return code if code is not None else self.codes.get(language)
+
+    def supports(self, provider_name: str, *codes: str) -> bool:
+        """Whether the provider supports every language"""
+        bit = self.provider_bits.get(provider_name, 0)
+        language_bits = self.language_bits
+        return bool(bit) and all(language_bits.get(code, 0) & bit for code in codes)
+
+
+class LanguageRegistry:
+    """
+    Immutable snapshot of the languages each provider supports
+    Changes build a new registry, which is swapped in with a single assignment so readers never see a partial update.
+    """
+    __slots__ = ('provider_languages', 'updated', 'localized', 'languages', 'names', 'index', 'resolver')
+
+    def __init__(self, provider_languages: Mapping[str, Mapping[str, str]], updated: Mapping[str, float],
+                 order: Iterable[str], localized: Optional[Mapping[str, Mapping[str, str]]] = None):
+        """
+        :param provider_languages: {'provider_name': {'en': 'English'} }
+        :param updated: {'provider_name': time the languages were fetched }
+        :param order: provider names in registration order, later providers' language names win
+        :param localized: Optional language names in other languages, {'es': {'en': 'Inglés'} }
+        """
+        order = tuple(order)
+        self.provider_languages: Mapping[str, Mapping[str, str]] = MappingProxyType(
+            {name: MappingProxyType(dict(provider_languages[name])) for name in order if name in provider_languages})
+        self.updated: Mapping[str, float] = MappingProxyType(
+            {name: updated[name] for name in self.provider_languages})
+
+        languages: Dict[str, Set[str]] = {}
+        names: Dict[str, str] = {}
+        for provider_name, provider_languages in self.provider_languages.items():
+            for code, language_name in provider_languages.items():
+                names[code] = language_name
+                languages.setdefault(code, set()).add(provider_name)
+        self.languages: Mapping[str, FrozenSet[str]] = MappingProxyType(
+            {code: frozenset(provider_names) for code, provider_names in languages.items()})  # {'en': {'provider'} }
+        self.names: Mapping[str, str] = MappingProxyType(names)  # {'en': 'English'}
+        self.localized: Mapping[str, Mapping[str, str]] = MappingProxyType(
+            {locale: MappingProxyType(dict(localized_names)) for locale, localized_names in (localized or {}).items()})
+        self.index = LanguageIndex(self.languages, names, order)
+        self.resolver = LanguageResolver(names, self.localized.values())
+
+    def replace(self, provider_languages: Mapping[str, Mapping[str, str]], updated: float,
+                order: Iterable[str]) -> "LanguageRegistry":
+        """Returns a new registry with the languages of some providers replaced"""
+        return LanguageRegistry({**self.provider_languages, **provider_languages},
+                                {**self.updated, **{name: updated for name in provider_languages}}, order,
+                                self.localized)
+
+    def with_localized(self, locale: str, names: Mapping[str, str], order: Iterable[str]) -> "LanguageRegistry":
+        """Returns a new registry that also resolves the language names of a locale"""
+        return LanguageRegistry(self.provider_languages, self.updated, order, {**self.localized, locale: names})
@@ -0,0 +1,175 @@
+import re
+import unicodedata
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+_PUNCTUATION = re.compile(r"[^\w\s-]")
+_QUALIFIER = re.compile(r"\s*\(.*?\)")  # "Portuguese (Brazil)"
+
+# Other ways to refer to languages, each alias resolves to the first of its codes that is supported
+ALIASES: Mapping[str, Sequence[str]] = {
+    'chinese': ('zh-Hans', 'zh-CN', 'zh'),
+    'mandarin': ('zh-Hans', 'zh-CN', 'zh'),
+    'simplified chinese': ('zh-Hans', 'zh-CN'),
+    'traditional chinese': ('zh-Hant', 'zh-TW'),
+    'zh': ('zh-Hans', 'zh-CN'),
+    'zh-cn': ('zh-Hans',),
+    'zh-sg': ('zh-Hans', 'zh-CN'),
+    'zh-hans': ('zh-CN',),
+    'zh-tw': ('zh-Hant',),
+    'zh-hk': ('zh-Hant', 'zh-TW'),
+    'zh-hant': ('zh-TW',),
+    'farsi': ('fa',),
+    'filipino': ('fil', 'tl'),
+    'tagalog': ('fil', 'tl'),
+    'fil': ('tl',),
+    'tl': ('fil',),
+    'he': ('iw',),
+    'iw': ('he',),
+    'hebrew': ('he', 'iw'),
+    'jw': ('jv',),
+    'jv': ('jw',),
+    'norwegian': ('nb', 'no'),
+    'no': ('nb',),
+    'nb': ('no',),
+    'serbian': ('sr-Cyrl', 'sr-Latn', 'sr'),
+    'sr': ('sr-Cyrl',),
+    'kurdish': ('ku', 'kmr'),
+    'burmese': ('my',),
+    'haitian': ('ht',),
+    'pt-br': ('pt',),
+    'pt-pt': ('pt-PT', 'pt'),
+}
+
+
+def fold(text: str) -> str:
+    """Normalize text for matching: no accents, punctuation or case, single spaces, hyphens instead of underscores"""
+    decomposed = unicodedata.normalize('NFKD', text)
+    stripped = "".join(character for character in decomposed if not unicodedata.combining(character))
+    return " ".join(_PUNCTUATION.sub("", stripped.casefold().replace('_', '-')).split())
+
+
+class _Node:
+    __slots__ = ('children', 'code', 'rank', 'best', 'best_rank')
+
+    def __init__(self):
+        self.children: Dict[str, _Node] = {}
+        self.code: Optional[str] = None  # Language of the term ending here
+        self.rank: Tuple[int, int] = (0, 0)
+        self.best: Optional[str] = None  # Language of the best term starting with this prefix
+        self.best_rank: Tuple[int, int] = (0, 0)
+
+
+class LanguageResolver:
+    """
+    Resolves user input such as "portugese", "chin", "zh-hans" or "español" to a language code
+    Codes, English names, aliases and localized names are folded into a trie once. Input is matched exactly, then as
+    a prefix, then within a small edit distance, so resolving never scans every language.
+    """
+    # Term priorities, lower wins between terms of the same length
+    CODE, NAME, ALIAS, LOCALIZED = range(4)
+
+    def __init__(self, names: Mapping[str, str], localized: Iterable[Mapping[str, str]] = (),
+                 aliases: Mapping[str, Sequence[str]] = ALIASES, min_prefix: int = 2, max_distance: int = 2,
+                 max_remembered: int = 4096):
+        """
+        :param names: English language names by code, {'en': 'English'}
+        :param localized: language names in other languages by code, e.g. from get_languages(locale='es')
+        :param aliases: other terms and the codes they may refer to, the first supported code is used
+        :param min_prefix: characters needed before input is matched as a prefix
+        :param max_distance: most edits allowed for a fuzzy match, fewer are allowed for short input
+        :param max_remembered: fuzzy matches remembered, as users tend to repeat the same typos
+        """
+        self.min_prefix = min_prefix
+        self.max_distance = max_distance
+        self.max_remembered = max_remembered
+        self._closest_cache: Dict[str, Optional[str]] = {}
+        self._terms: Dict[str, Tuple[str, Tuple[int, int]]] = {}  # {'folded term': ('code', rank) }
+        self._root = _Node()
+
+        codes = {fold(code): code for code in names}
+        for code in names:
+            self._add(code, code, self.CODE)
+        for code, name in names.items():
+            self._add(name, code, self.NAME)
+        for alias, candidates in aliases.items():
+            code = next((codes[folded] for folded in map(fold, candidates) if folded in codes), None)
+            if code is not None:
+                self._add(alias, code, self.ALIAS)
+        for code, name in names.items():
+            # "Portuguese (Brazil)" is also "Portuguese", the first such language keeps the bare name
+            self._add(_QUALIFIER.sub("", name), code, self.ALIAS)
+        for localized_names in localized:
+            for code, name in localized_names.items():
+                if code in names:
+                    self._add(name, code, self.LOCALIZED)
+
+    def _add(self, term: str, code: str, priority: int):
+        folded = fold(term)
+        if not folded:
+            return
+        rank = (len(folded), priority)
+        if folded in self._terms and self._terms[folded][1][1] <= priority:
+            return
+        self._terms[folded] = (code, rank)
+
+        node = self._root
+        for character in folded:
+            node = node.children.setdefault(character, _Node())
+            if node.best is None or rank < node.best_rank:
+                node.best, node.best_rank = code, rank
+        node.code, node.rank = code, rank
+
+    def resolve(self, language: str) -> Optional[str]:
+        """Code of the language the input most likely refers to, None when nothing is close enough"""
+        query = fold(language)
+        if not query:
+            return None
+        term = self._terms.get(query)
+        if term is not None:
+            return term[0]
+        if len(query) >= self.min_prefix and (code := self._prefix(query)) is not None:
+            return code
+        try:
+            return self._closest_cache[query]
+        except KeyError:
+            pass
+        if len(self._closest_cache) >= self.max_remembered:
+            self._closest_cache.clear()
+        code = self._closest_cache[query] = self._closest(query)
+        return code
+
+    def _prefix(self, query: str) -> Optional[str]:
+        node = self._root
+        for character in query:
+            node = node.children.get(character)
+            if node is None:
+                return None
+        return node.best
+
+    def _closest(self, query: str) -> Optional[str]:
+        """
+        Closest term by edit distance, walking the trie with one Levenshtein row per node
+        The first character is assumed to be right, which limits the walk to a single branch.
+        """
+        max_distance = min(self.max_distance, len(query) // 4)
+        first = self._root.children.get(query[0])
+        if max_distance < 1 or first is None:
+            return None
+        best: Optional[str] = None
+        best_key: Tuple[int, Tuple[int, int]] = (max_distance + 1, (0, 0))  # (distance, rank)
+        columns = len(query) + 1
+        first_row = [1, *range(columns - 1)]  # Distances from the first character to each prefix of query
+        stack: List[Tuple[str, _Node, List[int]]] = [
+            (character, child, first_row) for character, child in first.children.items()]
+        while stack:
+            character, node, previous = stack.pop()
+            row = [previous[0] + 1]
+            for column in range(1, columns):
+                row.append(min(row[column - 1] + 1, previous[column] + 1,
+                               previous[column - 1] + (query[column - 1] != character)))
+            if node.code is not None and (row[-1], node.rank) < best_key:
+                best, best_key = node.code, (row[-1], node.rank)
+            # Words below this node can't get closer than the row's minimum
+            if min(row) <= min(best_key[0], max_distance):
+                stack.extend((child_character, child, row) for child_character, child in node.children.items())
+        return best
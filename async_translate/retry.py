@@ -0,0 +1,143 @@
+import asyncio
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Optional, TypeVar
+
+from .errors import DeadlineExceeded
+
+T = TypeVar('T')
+
+_deadline: ContextVar[Optional[float]] = ContextVar('async_translate_deadline', default=None)
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float]):
+    """Limit every provider request made inside the block to finish within seconds, nested scopes can only shorten it"""
+    if seconds is None:
+        yield
+        return
+    current = _deadline.get()
+    expires = time.monotonic() + seconds
+    token = _deadline.set(expires if current is None else min(current, expires))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current deadline, None when there isn't one"""
+    expires = _deadline.get()
+    if expires is None:
+        return None
+    return max(expires - time.monotonic(), 0.0)
+
+
+async def within_deadline(awaitable: Awaitable[T]) -> T:
+    """Await awaitable, raising DeadlineExceeded and cancelling it once the current deadline passes"""
+    time_left = remaining()
+    if time_left is None:
+        return await awaitable
+    try:
+        return await asyncio.wait_for(awaitable, time_left)
+    except asyncio.TimeoutError:
+        if remaining() == 0:
+            raise DeadlineExceeded() from None
+        raise
+
+
+def without_deadline(awaitable: Awaitable[T]) -> "asyncio.Future[T]":
+    """
+    Schedule awaitable as a task outside the current deadline, for work shared by calls with their own deadlines
+    Each call limits its own wait with within_deadline, so one call's deadline can't cut the work short for the others.
+    """
+    context = copy_context()
+    context.run(_deadline.set, None)
+    return context.run(asyncio.ensure_future, awaitable)
+
+
+def backoff(attempt: int, base: float = 0.5, cap: float = 30.0) -> float:
+    """Exponential backoff with full jitter, attempt starts at 0"""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header, given either as seconds or as an HTTP date"""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryBudget:
+    """
+    Caps retries to a fraction of the requests sent, so retries can't multiply the load during an incident
+    Every request deposits `ratio` tokens and every retry withdraws one. `min_per_second` tokens are added each second
+    so low traffic can still retry.
+    """
+
+    def __init__(self, ratio: float = 0.1, min_per_second: float = 1.0, capacity: float = 100.0):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.capacity = capacity
+        self._balance = capacity
+        self._updated = time.monotonic()
+        self.requests = 0
+        self.retries = 0
+        self.rejected = 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self._balance = min(self._balance + (now - self._updated) * self.min_per_second, self.capacity)
+        self._updated = now
+
+    def request(self):
+        """Record a new (non retry) request"""
+        self._refill()
+        self.requests += 1
+        self._balance = min(self._balance + self.ratio, self.capacity)
+
+    def try_retry(self) -> bool:
+        """Withdraw a retry, False when the budget is spent"""
+        self._refill()
+        if self._balance < 1:
+            self.rejected += 1
+            return False
+        self._balance -= 1
+        self.retries += 1
+        return True
+
+
+retry_budget = RetryBudget()  # Shared by all providers in the process
+
+
+def retry_delay(attempt: int, max_attempts: int, retry_after: Optional[float] = None,
+                budget: Optional[RetryBudget] = retry_budget, max_delay: float = 30.0) -> Optional[float]:
+    """
+    Seconds to wait before retrying, None when the request shouldn't be retried
+    Retries stop after max_attempts, when the server asks to wait longer than max_delay, when waiting would pass the
+    current deadline, or when the budget is spent.
+    :param attempt: attempts made so far, starting at 1
+    :param retry_after: Optional seconds the server asked to wait, used instead of the backoff
+    :param max_delay: most seconds worth waiting before a retry
+    """
+    if attempt >= max_attempts:
+        return None
+    if retry_after is not None and retry_after > max_delay:
+        return None
+    delay = retry_after if retry_after is not None else backoff(attempt - 1, cap=max_delay)
+    time_left = remaining()
+    if time_left is not None and delay >= time_left:
+        return None
+    if budget is not None and not budget.try_retry():
+        return None
+    return delay
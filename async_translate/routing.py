@@ -0,0 +1,123 @@
+from collections import deque
+from typing import Callable, Deque, Dict, FrozenSet, Iterable, Mapping, Optional, Tuple
+
+from .errors import LanguageNotSupported
+
+
+class ProviderStats:
+    """Rolling latency and error rate estimate of a provider for one language"""
+    __slots__ = ('latency', 'error_rate', 'samples', 'recent')
+
+    def __init__(self, window: int = 100):
+        self.latency = 0.0  # Exponentially weighted moving average in seconds
+        self.error_rate = 0.0
+        self.samples = 0
+        self.recent: Deque[float] = deque(maxlen=window)  # Latest successful latencies, for percentiles
+
+    def record(self, latency: float, error: bool, alpha: float):
+        if self.samples:
+            self.latency += alpha * (latency - self.latency)
+            self.error_rate += alpha * (error - self.error_rate)
+        else:
+            self.latency = latency
+            self.error_rate = float(error)
+        self.samples += 1
+        if not error:
+            self.recent.append(latency)
+
+    def percentile(self, percentile: float) -> Optional[float]:
+        """Latency below which the given fraction (0-1) of recent requests finished, None without samples"""
+        if not self.recent:
+            return None
+        ordered = sorted(self.recent)
+        return ordered[min(int(percentile * len(ordered)), len(ordered) - 1)]
+
+
+class Router:
+    """
+    Routes each language to the fastest healthy provider supporting it
+    The best provider per language is recomputed when a result is recorded, so selecting one is a dict lookup.
+    """
+
+    def __init__(self, alpha: float = 0.1, max_error_rate: float = 0.5):
+        """
+        :param alpha: weight of a new sample in the moving averages
+        :param max_error_rate: error rate above which a provider is only used when nothing else is available
+        """
+        self.alpha = alpha
+        self.max_error_rate = max_error_rate
+        self._order: Dict[str, int] = {}  # Registration order, used to break ties
+        self._candidates: Dict[str, Tuple[str, ...]] = {}
+        self._supported: Dict[str, FrozenSet[str]] = {}
+        self._stats: Dict[Tuple[str, str], ProviderStats] = {}
+        self._best: Dict[str, str] = {}
+
+    def update(self, languages: Mapping[str, Iterable[str]], providers: Iterable[str]):
+        """Set the providers available for each language, {'en': {'provider_name'}}"""
+        self._order = {name: index for index, name in enumerate(providers)}
+        self._supported = {code: frozenset(names) for code, names in languages.items()}
+        self._candidates = {code: tuple(sorted(names, key=self._order.__getitem__))
+                            for code, names in self._supported.items()}
+        self._best = {code: self._rank(code) for code in self._candidates}
+
+    def stats(self, provider: str, language: str) -> ProviderStats:
+        try:
+            return self._stats[provider, language]
+        except KeyError:
+            stats = self._stats[provider, language] = ProviderStats()
+            return stats
+
+    def healthy(self, provider: str, language: str) -> bool:
+        stats = self._stats.get((provider, language))
+        return stats is None or stats.error_rate <= self.max_error_rate
+
+    def _score(self, provider: str, language: str) -> Tuple[bool, float]:
+        stats = self._stats.get((provider, language))
+        if stats is None:
+            # Untried providers get a turn, so every provider gets measured
+            return False, 0.0
+        return stats.error_rate > self.max_error_rate, stats.latency
+
+    def _rank(self, language: str) -> str:
+        return min(self._candidates[language], key=lambda provider: self._score(provider, language))
+
+    def record(self, provider: str, language: str, latency: float, error: bool = False):
+        """Record the outcome of a request to provider for language"""
+        self.stats(provider, language).record(latency, error, self.alpha)
+        if language in self._candidates:
+            self._best[language] = self._rank(language)
+
+    def candidates(self, language: str) -> Tuple[str, ...]:
+        """Providers supporting language, in registration order"""
+        try:
+            return self._candidates[language]
+        except KeyError:
+            raise LanguageNotSupported(language)
+
+    def alternative(self, language: str, exclude: str, source: Optional[str] = None,
+                    allowed: Optional[Callable[[str], bool]] = None) -> Optional[str]:
+        """
+        Best provider for language other than exclude, None if there isn't one
+        :param source: Optional language the provider must also support
+        :param allowed: Optional filter on provider names
+        """
+        supported = self._supported.get(source, ()) if source else None
+        best, best_score = None, None
+        for provider in self._candidates.get(language, ()):
+            if provider == exclude or (supported is not None and provider not in supported) \
+                    or (allowed is not None and not allowed(provider)):
+                continue
+            score = self._score(provider, language)
+            if best_score is None or score < best_score:
+                best, best_score = provider, score
+        return best
+
+    def select(self, language: str, preferred: Optional[str] = "") -> str:
+        """Name of the provider to use for language, preferred is used if it supports the language and is healthy"""
+        try:
+            best = self._best[language]
+        except KeyError:
+            raise LanguageNotSupported(language)
+        if preferred and preferred in self._supported[language] and self.healthy(preferred, language):
+            return preferred
+        return best
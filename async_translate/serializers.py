@@ -0,0 +1,62 @@
+"""
+JSON encoding and decoding used for provider requests and responses
+The fastest installed library is used, orjson, then ujson, falling back to the standard library.
+"""
+import json
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+
+Dumps = Callable[[Any], bytes]
+Loads = Callable[[Union[bytes, str]], Any]
+
+# Raised by every backend for invalid JSON, orjson's and ujson's errors subclass it
+JSONDecodeError = ValueError
+
+
+def _orjson() -> Tuple[Dumps, Loads]:
+    import orjson
+    return orjson.dumps, orjson.loads
+
+
+def _ujson() -> Tuple[Dumps, Loads]:
+    import ujson
+    return lambda obj: ujson.dumps(obj, ensure_ascii=False).encode(), ujson.loads
+
+
+def _json() -> Tuple[Dumps, Loads]:
+    return lambda obj: json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode(), json.loads
+
+
+BACKENDS: Dict[str, Callable[[], Tuple[Dumps, Loads]]] = {'orjson': _orjson, 'ujson': _ujson, 'json': _json}
+
+name: str = 'json'
+_dumps, _loads = _json()
+
+
+def use(backend: Optional[str] = None):
+    """Switch to a JSON backend by name, or to the fastest installed one when None"""
+    global name, _dumps, _loads
+    for candidate in ([backend] if backend else BACKENDS):
+        try:
+            _dumps, _loads = BACKENDS[candidate]()
+        except ModuleNotFoundError:
+            if backend:
+                raise
+            continue
+        name = candidate
+        return
+
+
+def dumps(obj: Any) -> bytes:
+    return _dumps(obj)
+
+
+def dumps_str(obj: Any) -> str:
+    """Encode to str, for APIs such as aiohttp's json_serialize"""
+    return _dumps(obj).decode()
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    return _loads(data)
+
+
+use()
@@ -0,0 +1,47 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+from .retry import without_deadline
+
+T = TypeVar('T')
+
+
+class SingleFlight:
+    """
+    De-duplicates identical concurrent calls
+    Callers using the same key while a call is in flight share its result instead of starting their own.
+    Cancelling one caller doesn't cancel the shared call for the others, it's only cancelled once every caller is.
+    The shared call runs without the first caller's deadline, each caller's deadline only limits its own wait.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self._waiters: Dict[Hashable, int] = {}
+
+    def __len__(self):
+        return len(self._calls)
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        call = self._calls.get(key)
+        if call is None:
+            call = self._calls[key] = without_deadline(func())
+            self._waiters[key] = 0
+            call.add_done_callback(lambda done: self._finish(key, done))
+        self._waiters[key] += 1
+        try:
+            return await asyncio.shield(call)
+        except asyncio.CancelledError:
+            if not call.done() and self._calls.get(key) is call and self._waiters[key] == 1:
+                call.cancel()
+            raise
+        finally:
+            if self._calls.get(key) is call:
+                self._waiters[key] -= 1
+
+    def _finish(self, key: Hashable, call: asyncio.Future):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+            del self._waiters[key]
+        # Mark the exception as retrieved, every caller may have been cancelled before it was raised
+        if not call.cancelled():
+            call.exception()
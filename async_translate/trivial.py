@@ -0,0 +1,56 @@
+import re
+from dataclasses import dataclass, field
+from typing import List
+
+# Spans that are never translated: code, URLs, mentions, channels, roles, timestamps and custom emoji
+UNTRANSLATABLE = re.compile(
+    r"```.*?```"  # Code blocks
+    r"|`[^`\n]+`"  # Inline code
+    r"|<?https?://[^\s<>]+>?"  # URLs, optionally without embed
+    r"|<(?:@[!&]?|#)\d+>"  # User, role and channel mentions
+    r"|@(?:everyone|here)\b"
+    r"|<a?:\w+:\d+>"  # Custom emoji
+    r"|<t:-?\d+(?::[tTdDfFR])?>"  # Timestamps
+    r"|(?<![\w:]):[a-z0-9_+-]*[a-z][a-z0-9_+-]*:(?![\w:])",  # Emoji shortcodes, not times or words between colons
+    re.DOTALL
+)
+PLACEHOLDER = "⟦{}⟧"
+PLACEHOLDER_PATTERN = re.compile(r"⟦\s*(\d+)\s*⟧")
+
+
+def is_untranslatable(content: str) -> bool:
+    """Whether content has nothing to translate, e.g. only emoji, URLs, mentions, numbers, code or whitespace"""
+    return not any(character.isalpha() for character in UNTRANSLATABLE.sub("", content))
+
+
+@dataclass
+class Masked:
+    """Content with its untranslatable spans swapped for numbered placeholders"""
+    text: str
+    spans: List[str] = field(default_factory=list)
+
+    def restore(self, translated: str) -> str:
+        """Put the spans back into the translated text, spans whose placeholder was lost are appended"""
+        restored = set()
+
+        def replace(match: re.Match) -> str:
+            index = int(match.group(1))
+            if index >= len(self.spans):
+                return match.group(0)
+            restored.add(index)
+            return self.spans[index]
+
+        text = PLACEHOLDER_PATTERN.sub(replace, translated)
+        missing = [span for index, span in enumerate(self.spans) if index not in restored]
+        return " ".join([text, *missing]) if missing else text
+
+
+def mask(content: str) -> Masked:
+    masked = Masked(text="")
+
+    def replace(match: re.Match) -> str:
+        masked.spans.append(match.group(0))
+        return PLACEHOLDER.format(len(masked.spans) - 1)
+
+    masked.text = UNTRANSLATABLE.sub(replace, content)
+    return masked
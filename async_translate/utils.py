@@ -0,0 +1,7 @@
+from typing import Any, Hashable, Mapping, Tuple
+
+
+def freeze_options(options: Mapping[str, Any]) -> Tuple[Tuple[str, Hashable], ...]:
+    """Turn provider options into a hashable, order independent key"""
+    return tuple(sorted((key, value if isinstance(value, Hashable) else repr(value))
+                        for key, value in options.items()))
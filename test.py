@@ -19,15 +19,39 @@ google_credentials = {
 
 ```
 """
+import asyncio
+import gc
+import json
+import os
+import sqlite3
+import tempfile
+import time
 import unittest
+from email.utils import formatdate
+from typing import List, Optional, Sequence
 from unittest import TestCase, IsolatedAsyncioTestCase
 
 from google.auth.exceptions import DefaultCredentialsError
 
 import testCreds
 from async_translate import AsyncTranslate
+from async_translate.abc import BaseProvider, Translation
+from async_translate.batching import batch_ranges
+from async_translate.cache import LRUCache, SQLiteCache, TranslationCache
+from async_translate.chunking import split_text
+from async_translate.circuitbreaker import CircuitBreaker
+from async_translate.coalescer import Coalescer
+from async_translate.errors import DeadlineExceeded, NotEnoughCharacters, TranslatorException
+from async_translate.quota import QuotaLedger
+from async_translate.registry import LanguageRegistry
+from async_translate.resolver import LanguageResolver
+from async_translate.retry import RetryBudget, deadline_scope, parse_retry_after, remaining, retry_delay, \
+    within_deadline
+from async_translate.singleflight import SingleFlight
+from async_translate.trivial import is_untranslatable, mask
 from async_translate.providers.azure import Azure
-from async_translate.providers.azure.errors import NoAPIKeys
+from async_translate.providers.azure.errors import AllKeysExhausted, NoAPIKeys, RequestException
+from async_translate.providers.azure.keypool import KeyPool
 from async_translate.providers.google import Google
 
 
@@ -89,5 +113,682 @@ class AsyncTranslateTests(IsolatedAsyncioTestCase):
         self.assertIsInstance(provider, Google)
 
 
+class FakeProvider(BaseProvider):
+    """Translates to upper case after delay seconds, recording each request's texts and remaining deadline"""
+    max_batch_size = 10
+
+    def __init__(self, name: str = 'fake', delay: float = 0.0, error: Optional[Exception] = None):
+        self._name = name
+        self.delay = delay
+        self.error = error
+        self.languages = {'en': 'English', 'de': 'German'}
+        self.calls: List[List[str]] = []
+        self.deadlines: List[Optional[float]] = []
+        self.cancelled = 0
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    async def get_languages(self, locale=None, *args, **kwargs):
+        return dict(self.languages)
+
+    async def detect(self, content) -> str:
+        return 'en'
+
+    async def translate(self, content: str, to: str, source="", **options) -> Translation:
+        return (await self.translate_batch([content], to, source, **options))[0]
+
+    async def translate_batch(self, contents: Sequence[str], to: str, source="", **options) -> List[Translation]:
+        self.calls.append(list(contents))
+        self.deadlines.append(remaining())
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.error is not None:
+            raise self.error
+        return [Translation(text=content.upper(), to=to, source='en') for content in contents]
+
+
+class FakeResponse:
+    def __init__(self, status: int, data, headers=None):
+        self.status = status
+        self.body = json.dumps(data).encode()
+        self.headers = headers or {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    async def read(self):
+        return self.body
+
+    async def text(self):
+        return self.body.decode()
+
+
+class FakeSession:
+    """Answers Azure requests with the given responses in order, repeating the last one"""
+
+    def __init__(self, *responses: FakeResponse):
+        self.responses = list(responses)
+        self.keys = []  # API key of each request
+
+    def request(self, headers, **kwargs):
+        self.keys.append(headers['Ocp-Apim-Subscription-Key'])
+        return self.responses.pop(0) if len(self.responses) > 1 else self.responses[0]
+
+    async def session(self):
+        return self
+
+
+class AzureRetryTests(IsolatedAsyncioTestCase):
+    async def test_switch_throttled_key(self):
+        """Ensure a throttled key is swapped for another one right away"""
+        provider = Azure(['a', 'b'])
+        provider.session_manager = FakeSession(FakeResponse(429, {'error': {'code': 429001, 'message': ''}}),
+                                               FakeResponse(200, [{'language': 'de'}]))
+        self.assertEqual(await asyncio.wait_for(provider.detect("hallo"), 1), 'de')
+        self.assertEqual(provider.session_manager.keys, ['a', 'b'])
+
+    async def test_rejected_keys_fail_fast(self):
+        """Ensure AllKeysExhausted is raised instead of waiting out the quota cooldown when every key is rejected"""
+        provider = Azure('a')
+        provider.session_manager = FakeSession(FakeResponse(403, {'error': {'code': 403001, 'message': ''}}))
+        with self.assertRaises(AllKeysExhausted):
+            await asyncio.wait_for(provider.detect("hallo"), 1)
+        self.assertEqual(provider.session_manager.keys, ['a'])
+
+    async def test_long_retry_after_not_waited(self):
+        """Ensure a Retry-After longer than worth waiting fails the request instead of blocking"""
+        provider = Azure('a')
+        provider.session_manager = FakeSession(
+            FakeResponse(429, {'error': {'code': 429001, 'message': ''}}, {'Retry-After': '3600'}))
+        with self.assertRaises(AllKeysExhausted):
+            await asyncio.wait_for(provider.detect("hallo"), 1)
+        with self.assertRaises(RequestException):
+            await asyncio.wait_for(provider.detect("hallo", key_override='b'), 1)
+
+    async def test_server_error_retried(self):
+        """Ensure server errors are retried after the Retry-After the server asked for"""
+        provider = Azure('a')
+        provider.session_manager = FakeSession(FakeResponse(503, None, {'Retry-After': '0'}),
+                                               FakeResponse(200, [{'language': 'de'}]))
+        self.assertEqual(await asyncio.wait_for(provider.detect("hallo"), 1), 'de')
+        self.assertEqual(len(provider.session_manager.keys), 2)
+
+    async def test_attempt_cap(self):
+        """Ensure a failing request is sent at most max_attempts times"""
+        provider = Azure('a')
+        provider.max_attempts = 3
+        provider.session_manager = FakeSession(FakeResponse(503, None, {'Retry-After': '0'}))
+        with self.assertRaises(TranslatorException):
+            await asyncio.wait_for(provider.detect("hallo"), 1)
+        self.assertEqual(len(provider.session_manager.keys), 3)
+
+    async def test_no_retry_past_deadline(self):
+        """Ensure a retry isn't waited for when it would pass the deadline"""
+        provider = Azure('a')
+        provider.session_manager = FakeSession(FakeResponse(503, None, {'Retry-After': '1'}))
+        with deadline_scope(0.5), self.assertRaises(TranslatorException):
+            await asyncio.wait_for(provider.detect("hallo"), 0.4)
+        self.assertEqual(len(provider.session_manager.keys), 1)
+
+
+class BatchingTests(TestCase):
+    def test_batch_size(self):
+        """Ensure batches never contain more than max_size texts"""
+        self.assertEqual(list(batch_ranges(['a'] * 5, 2)), [(0, 2), (2, 4), (4, 5)])
+
+    def test_batch_characters(self):
+        """Ensure batches respect the character limit, oversized texts getting their own batch"""
+        self.assertEqual(list(batch_ranges(['aaa', 'bb', 'c', 'dddddd'], 10, 4)), [(0, 1), (1, 3), (3, 4)])
+
+
+class CacheTests(IsolatedAsyncioTestCase):
+    async def test_lru_eviction(self):
+        """Ensure the least recently used entry is evicted once full"""
+        cache = LRUCache(maxsize=2)
+        await cache.set('a', 'en')
+        await cache.set('b', 'de')
+        await cache.get('a')
+        await cache.set('c', 'fr')
+        self.assertIsNone(await cache.get('b'))
+        self.assertEqual(await cache.get('a'), 'en')
+        self.assertEqual(cache.evictions, 1)
+
+    async def test_sqlite_round_trip(self):
+        """Ensure translations and detections are read back after reopening the database"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'cache.db')
+            cache = SQLiteCache(path)
+            await cache.set('translation', Translation(text="Hallo", to='de', source='en'))
+            await cache.set('detection', 'en')
+            await cache.close()
+
+            cache = SQLiteCache(path)
+            self.assertEqual(await cache.get('translation'), Translation(text="Hallo", to='de', source='en'))
+            self.assertEqual(await cache.get('detection'), 'en')
+            self.assertIsNone(await cache.get('missing'))
+            await cache.close()
+
+    async def test_sqlite_unreadable_entry(self):
+        """Ensure an entry that can't be decoded is a miss and is removed"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'cache.db')
+            cache = SQLiteCache(path)
+            await cache.set('translation', Translation(text="Hallo", to='de'))
+            await cache.close()
+            db = sqlite3.connect(path)
+            db.execute("UPDATE entries SET value = ?", (b'\x93garbage',))
+            db.commit()
+            db.close()
+
+            translations = TranslationCache(SQLiteCache(path))
+            self.assertIsNone(await translations.get_translation('translation'))
+            await translations.close()
+            db = sqlite3.connect(path)
+            self.assertEqual(db.execute("SELECT COUNT(*) FROM entries").fetchone()[0], 0)
+            db.close()
+
+    def test_translation_keys_keep_whitespace(self):
+        """Ensure texts differing only in surrounding whitespace don't share translations, but share detections"""
+        cache = TranslationCache()
+        provider = Azure('key')
+        self.assertNotEqual(cache.translation_key(provider, "hi", 'de'),
+                            cache.translation_key(provider, "hi\n\n", 'de'))
+        self.assertEqual(cache.detection_key(provider, "hi"), cache.detection_key(provider, " hi\n"))
+
+
+class CircuitBreakerTests(TestCase):
+    def test_opens_on_failures(self):
+        """Ensure the breaker opens once the failure rate is reached and refuses requests"""
+        breaker = CircuitBreaker(failure_rate=0.5, minimum_calls=4)
+        for failed in (False, True, False):
+            breaker.record(0.1, failed)
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        breaker.record(0.1, True)
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(breaker.allow())
+
+    def test_half_open_single_probe(self):
+        """Ensure a half-open breaker lets one probe through and closes when it succeeds"""
+        breaker = CircuitBreaker(minimum_calls=1, open_duration=0)
+        breaker.record(0.1, True)
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertTrue(breaker.available())
+        self.assertTrue(breaker.allow())
+        breaker.open_duration = 60  # Keep the probe outstanding
+        self.assertFalse(breaker.available())
+        self.assertFalse(breaker.allow())
+        breaker.record(0.1)
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_half_open_probe_failure(self):
+        """Ensure a failed probe opens the breaker again"""
+        breaker = CircuitBreaker(minimum_calls=1, open_duration=0)
+        breaker.record(0.1, True)
+        self.assertTrue(breaker.allow())
+        breaker.open_duration = 60
+        breaker.record(0.1, True)
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+
+class ChunkingTests(TestCase):
+    def test_split_sentences(self):
+        """Ensure long text is split on sentence boundaries and joins back to the original"""
+        text = "First sentence here. Second one! Third?"
+        chunks = split_text(text, 25)
+        self.assertEqual(chunks, ["First sentence here. ", "Second one! Third?"])
+        self.assertEqual("".join(chunks), text)
+
+    def test_split_keeps_code_blocks(self):
+        """Ensure code blocks are never split"""
+        text = "Look at this. ```code. with. sentences.``` Done."
+        self.assertIn("```code. with. sentences.```", split_text(text, 20))
+
+
+class CoalescerTests(IsolatedAsyncioTestCase):
+    async def test_group_by_key(self):
+        """Ensure calls are batched per target language and source"""
+        coalescer = Coalescer()
+        provider = FakeProvider()
+        translations = await asyncio.gather(coalescer.translate(provider, "a", 'de'),
+                                            coalescer.translate(provider, "b", 'de'),
+                                            coalescer.translate(provider, "c", 'fr'),
+                                            coalescer.translate(provider, "d", 'de', 'en'))
+        self.assertEqual([translation.text for translation in translations], ["A", "B", "C", "D"])
+        self.assertEqual(sorted(provider.calls), [["a", "b"], ["c"], ["d"]])
+
+    async def test_flush_on_batch_size(self):
+        """Ensure a batch is sent as soon as it reaches max_batch_size"""
+        coalescer = Coalescer(delay=10)
+        provider = FakeProvider()
+        provider.max_batch_size = 2
+        calls = [asyncio.ensure_future(coalescer.translate(provider, content, 'de')) for content in "abc"]
+        await asyncio.wait_for(asyncio.gather(*calls[:2]), 1)
+        self.assertEqual(provider.calls, [["a", "b"]])
+        await coalescer.close()
+        self.assertEqual((await calls[2]).text, "C")
+        self.assertEqual(provider.calls, [["a", "b"], ["c"]])
+
+    async def test_flush_on_batch_characters(self):
+        """Ensure a batch is sent before a text would take it past max_batch_characters"""
+        coalescer = Coalescer(delay=10)
+        provider = FakeProvider()
+        provider.max_batch_characters = 5
+        calls = [asyncio.ensure_future(coalescer.translate(provider, content, 'de')) for content in ("abc", "de", "f")]
+        await asyncio.wait_for(asyncio.gather(*calls[:2]), 1)
+        self.assertEqual(provider.calls, [["abc", "de"]])
+        await coalescer.close()
+        self.assertEqual(provider.calls, [["abc", "de"], ["f"]])
+
+    async def test_error_reaches_every_caller(self):
+        """Ensure a failed batch raises its error to every call in it"""
+        coalescer = Coalescer()
+        provider = FakeProvider(error=ValueError("failed"))
+        results = await asyncio.gather(coalescer.translate(provider, "a", 'de'),
+                                       coalescer.translate(provider, "b", 'de'), return_exceptions=True)
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+        self.assertEqual(provider.calls, [["a", "b"]])
+
+    async def test_error_after_callers_cancelled(self):
+        """Ensure a batch failing after every caller was cancelled doesn't log unretrieved exceptions"""
+        errors = []
+        asyncio.get_running_loop().set_exception_handler(lambda loop, context: errors.append(context))
+        coalescer = Coalescer()
+        provider = FakeProvider(delay=0.05, error=ValueError("failed"))
+        calls = [asyncio.ensure_future(coalescer.translate(provider, content, 'de')) for content in "ab"]
+        await asyncio.sleep(0.02)
+        for call in calls:
+            call.cancel()
+        await coalescer.close()
+        del calls
+        gc.collect()
+        self.assertEqual(errors, [])
+
+
+class DeadlineTests(IsolatedAsyncioTestCase):
+    async def test_shared_call_outlives_deadline(self):
+        """Ensure a call sharing another call's request isn't cut short by the other call's deadline"""
+        translator = AsyncTranslate()
+        provider = FakeProvider(delay=0.2)
+        await translator.add_provider(provider)
+        first = asyncio.ensure_future(translator.translate('de', "hello", provider, deadline=0.1))
+        await asyncio.sleep(0.01)  # Let the call with a deadline start the request
+        self.assertEqual((await translator.translate('de', "hello", provider)).text, "HELLO")
+        with self.assertRaises(DeadlineExceeded):
+            await first
+        self.assertEqual(provider.deadlines, [None])
+        await translator.close()
+
+    async def test_coalesced_batch_without_deadline(self):
+        """Ensure a batch isn't sent with the deadline of the call that started it, each call's deadline still holds"""
+        coalescer = Coalescer(delay=0.05)
+        provider = FakeProvider(delay=0.2)
+
+        async def translate_within(seconds: float) -> Translation:
+            with deadline_scope(seconds):
+                return await within_deadline(coalescer.translate(provider, "hello", 'de'))
+
+        first = asyncio.ensure_future(translate_within(0.1))
+        await asyncio.sleep(0.01)  # Let the call with a deadline start the batch
+        self.assertEqual((await coalescer.translate(provider, "world", 'de')).text, "WORLD")
+        with self.assertRaises(DeadlineExceeded):
+            await first
+        self.assertEqual(provider.calls, [["hello", "world"]])
+        self.assertEqual(provider.deadlines, [None])
+
+
+class HedgingTests(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.ledger = QuotaLedger(default_balance=100)
+        self.translator = AsyncTranslate(quota=self.ledger)
+        self.slow = FakeProvider('slow', delay=0.5)
+        self.fast = FakeProvider('fast')
+        await self.translator.add_providers(self.slow, self.fast)
+
+    async def asyncTearDown(self):
+        await self.translator.close()
+
+    async def test_alternative_wins(self):
+        """Ensure a slow provider loses to the alternative, is cancelled, and the winner is charged"""
+        start = time.monotonic()
+        translation = await self.translator.translate('de', "hello", self.slow, hedge_after=0.05, tenant='tenant')
+        self.assertEqual(translation.text, "HELLO")
+        self.assertLess(time.monotonic() - start, 0.4)
+        await asyncio.sleep(0.01)
+        self.assertEqual(self.slow.cancelled, 1)
+        self.assertEqual(self.fast.calls, [["hello"]])
+        self.assertEqual(self.ledger.balance('tenant', 'slow'), 100)
+        self.assertEqual(self.ledger.balance('tenant', 'fast'), 95)
+
+    async def test_alternative_needs_quota(self):
+        """Ensure the alternative isn't raced when the tenant has no characters left with it"""
+        self.slow.delay = 0.1
+        self.ledger.set_balance('tenant', 'fast', 0)
+        await self.translator.translate('de', "hello", self.slow, hedge_after=0.05, tenant='tenant')
+        self.assertEqual(self.fast.calls, [])
+        self.assertEqual(self.ledger.balance('tenant', 'slow'), 95)
+        self.assertEqual(self.ledger.balance('tenant', 'fast'), 0)
+
+    async def test_primary_error_raised(self):
+        """Ensure the primary's error is raised when every provider fails"""
+        self.slow.delay = 0.1
+        self.slow.error = ValueError("primary")
+        self.fast.error = ValueError("alternative")
+        with self.assertRaisesRegex(ValueError, "primary"):
+            await self.translator.translate('de', "hello", self.slow, hedge_after=0.05, tenant='tenant')
+        self.assertEqual(self.fast.calls, [["hello"]])
+        self.assertEqual(self.ledger.balance('tenant', 'slow'), 100)
+        self.assertEqual(self.ledger.balance('tenant', 'fast'), 100)
+
+
+class KeyPoolTests(TestCase):
+    def test_weighted_spread(self):
+        """Ensure keys are handed out in proportion to their weights"""
+        pool = KeyPool(['a', 'b'], weights=[2, 1])
+        keys = [pool.acquire().key for _ in range(300)]
+        self.assertEqual(keys.count('a'), 200)
+        self.assertEqual(keys.count('b'), 100)
+
+    def test_throttled_key_skipped(self):
+        """Ensure a throttled key isn't used until its cooldown ends"""
+        pool = KeyPool(['a', 'b'], min_throttle_cooldown=0)
+        pool.throttled(pool['a'], retry_after=0.05)
+        self.assertEqual({pool.acquire().key for _ in range(10)}, {'b'})
+        time.sleep(0.06)
+        self.assertIn('a', {pool.acquire().key for _ in range(10)})
+
+    def test_exhausted_only_without_usable_keys(self):
+        """Ensure AllKeysExhausted is only raised once every key is cooling down or out of quota"""
+        pool = KeyPool(['a', 'b', 'c'], quota=10)
+        pool.throttled(pool['a'])
+        pool.exhausted(pool['b'])
+        self.assertEqual(pool.acquire().key, 'c')
+        pool.success(pool['c'], 10)
+        with self.assertRaises(AllKeysExhausted):
+            pool.acquire()
+
+
+class QuotaTests(IsolatedAsyncioTestCase):
+    async def test_reserve_commit_refund(self):
+        """Ensure reservations can't overspend and refunds restore the balance"""
+        ledger = QuotaLedger(default_balance=10)
+        reservation = await ledger.reserve('tenant', 'azure', 8)
+        with self.assertRaises(NotEnoughCharacters):
+            await ledger.reserve('tenant', 'azure', 3)
+        ledger.refund(reservation)
+        ledger.commit(await ledger.reserve('tenant', 'azure', 4))
+        self.assertEqual(ledger.balance('tenant', 'azure'), 6)
+
+
+class RegistryTests(TestCase):
+    def test_index_lookups(self):
+        """Ensure codes and names resolve case-insensitively and support checks use every provider's languages"""
+        registry = LanguageRegistry({'azure': {'en': 'English', 'pt': 'Portuguese'}, 'google': {'en': 'English'}},
+                                    {'azure': 0.0, 'google': 0.0}, ['azure', 'google'])
+        self.assertEqual(registry.index.code('PORTUGUESE'), 'pt')
+        self.assertEqual(registry.index.code('EN'), 'en')
+        self.assertTrue(registry.index.supports('google', 'en'))
+        self.assertFalse(registry.index.supports('google', 'en', 'pt'))
+
+
+class LanguageSnapshotTests(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'languages.json')
+        translator = AsyncTranslate()
+        await translator.add_provider(FakeProvider())
+        await translator.save_languages(self.path)
+        await translator.close()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def edit(self, change):
+        with open(self.path) as file:
+            data = json.load(file)
+        change(data)
+        with open(self.path, 'w') as file:
+            json.dump(data, file)
+
+    async def test_restore_then_refresh(self):
+        """Ensure restored languages are used right away and replaced once the background fetch arrives"""
+        translator = AsyncTranslate()
+        self.assertTrue(await translator.load_languages(self.path))
+        provider = FakeProvider()
+        provider.languages = {'en': 'English', 'de': 'German', 'fr': 'French'}
+        await translator.add_provider(provider)
+        self.assertEqual(set(translator.languages), {'en', 'de'})
+        self.assertTrue(translator.language_index.supports('fake', 'de'))
+        await asyncio.sleep(0.01)
+        self.assertEqual(set(translator.languages), {'en', 'de', 'fr'})
+        await translator.close()
+
+    async def test_max_age(self):
+        """Ensure saved languages older than max_age are fetched instead"""
+        self.edit(lambda data: data['providers']['fake'].update(updated=time.time() - 3600))
+        provider = FakeProvider()
+        provider.languages = {'en': 'English', 'fr': 'French'}
+        translator = AsyncTranslate()
+        self.assertTrue(await translator.load_languages(self.path, max_age=60))
+        await translator.add_provider(provider)
+        self.assertEqual(set(translator.languages), {'en', 'fr'})
+        await translator.close()
+
+        translator = AsyncTranslate()
+        self.assertTrue(await translator.load_languages(self.path, max_age=7200))
+        await translator.add_provider(FakeProvider())
+        self.assertEqual(translator.language_names['de'], 'German')
+        await translator.close()
+
+    async def test_malformed(self):
+        """Ensure missing, invalid or malformed files are ignored without restoring anything"""
+        translator = AsyncTranslate()
+        self.assertFalse(await translator.load_languages(os.path.join(self.directory.name, 'missing.json')))
+        self.edit(lambda data: data['providers']['fake'].pop('languages'))
+        self.assertFalse(await translator.load_languages(self.path))
+        self.edit(lambda data: data['providers']['fake'].update(languages=['en'], names={'en': 1}))
+        self.assertFalse(await translator.load_languages(self.path))
+        self.edit(lambda data: data.update(version=0))
+        self.assertFalse(await translator.load_languages(self.path))
+        with open(self.path, 'w') as file:
+            file.write("{")
+        self.assertFalse(await translator.load_languages(self.path))
+
+        provider = FakeProvider()
+        provider.languages = {'fr': 'French'}
+        await translator.add_provider(provider)
+        self.assertEqual(set(translator.languages), {'fr'})
+        await translator.close()
+
+
+class ResolverTests(TestCase):
+    def test_resolve(self):
+        """Ensure typos, prefixes, aliases and accented localized names resolve to codes"""
+        resolver = LanguageResolver({'pt': 'Portuguese (Brazil)', 'zh-Hans': 'Chinese Simplified', 'es': 'Spanish'},
+                                    [{'es': 'Español'}])
+        self.assertEqual(resolver.resolve("portugese"), 'pt')
+        self.assertEqual(resolver.resolve("chin"), 'zh-Hans')
+        self.assertEqual(resolver.resolve("ZH-CN"), 'zh-Hans')
+        self.assertEqual(resolver.resolve("espanol"), 'es')
+        self.assertIsNone(resolver.resolve("klingon"))
+
+
+class RetryTests(IsolatedAsyncioTestCase):
+    def test_attempt_cap(self):
+        """Ensure no retry is allowed once max_attempts were made"""
+        self.assertEqual(retry_delay(4, 5, 0.0, budget=None), 0.0)
+        self.assertIsNone(retry_delay(5, 5, 0.0, budget=None))
+
+    def test_long_retry_after(self):
+        """Ensure a Retry-After longer than max_delay isn't waited for"""
+        self.assertEqual(retry_delay(1, 5, 30.0, budget=None), 30.0)
+        self.assertIsNone(retry_delay(1, 5, 3600.0, budget=None))
+        self.assertLessEqual(retry_delay(10, 20, budget=None), 30.0)
+
+    def test_budget_exhaustion(self):
+        """Ensure retries stop once the budget is spent and requests earn them back"""
+        budget = RetryBudget(ratio=0.5, min_per_second=0, capacity=2)
+        self.assertIsNotNone(retry_delay(1, 5, 0.0, budget=budget))
+        self.assertIsNotNone(retry_delay(1, 5, 0.0, budget=budget))
+        self.assertIsNone(retry_delay(1, 5, 0.0, budget=budget))
+        budget.request()
+        budget.request()
+        self.assertIsNotNone(retry_delay(1, 5, 0.0, budget=budget))
+        self.assertEqual((budget.retries, budget.rejected), (3, 1))
+
+    async def test_deadline_cutoff(self):
+        """Ensure retries that would pass the deadline aren't waited for and calls are cut off once it passes"""
+        with deadline_scope(0.5):
+            self.assertEqual(retry_delay(1, 5, 0.1, budget=None), 0.1)
+            self.assertIsNone(retry_delay(1, 5, 1.0, budget=None))
+            with deadline_scope(10):
+                self.assertLessEqual(remaining(), 0.5)
+            with self.assertRaises(DeadlineExceeded):
+                await within_deadline(asyncio.sleep(1))
+        self.assertIsNone(remaining())
+
+    def test_parse_retry_after(self):
+        """Ensure Retry-After is understood in seconds and as an HTTP date"""
+        self.assertEqual(parse_retry_after("120"), 120.0)
+        self.assertAlmostEqual(parse_retry_after(formatdate(time.time() + 60, usegmt=True)), 60, delta=2)
+        self.assertEqual(parse_retry_after(formatdate(time.time() - 60, usegmt=True)), 0.0)
+        self.assertIsNone(parse_retry_after("soon"))
+        self.assertIsNone(parse_retry_after(None))
+
+
+class SingleFlightTests(IsolatedAsyncioTestCase):
+    async def test_cancel_one_waiter(self):
+        """Ensure cancelling one waiter doesn't cancel the shared call for the other"""
+        flight = SingleFlight()
+        calls = []
+
+        async def call():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return 'result'
+
+        first = asyncio.ensure_future(flight.do('key', call))
+        second = asyncio.ensure_future(flight.do('key', call))
+        await asyncio.sleep(0)
+        first.cancel()
+        self.assertEqual(await second, 'result')
+        self.assertTrue(first.cancelled())
+        self.assertEqual(len(calls), 1)
+
+    async def test_error_reaches_every_waiter(self):
+        """Ensure an error is raised to every waiter"""
+        flight = SingleFlight()
+
+        async def call():
+            await asyncio.sleep(0.01)
+            raise ValueError('failed')
+
+        results = await asyncio.gather(flight.do('key', call), flight.do('key', call), return_exceptions=True)
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+        self.assertEqual(len(flight), 0)
+
+    async def test_cancel_every_waiter(self):
+        """Ensure the shared call is cancelled once every waiter is"""
+        flight = SingleFlight()
+        started = asyncio.Event()
+        cancelled = asyncio.Event()
+
+        async def call():
+            started.set()
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        waiters = [asyncio.ensure_future(flight.do('key', call)) for _ in range(2)]
+        await started.wait()
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        await asyncio.wait_for(cancelled.wait(), 1)
+        self.assertEqual(len(flight), 0)
+
+
+class StreamTests(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.translator = AsyncTranslate()
+        self.provider = FakeProvider()
+        await self.translator.add_provider(self.provider)
+        self.pulled = 0
+
+    async def asyncTearDown(self):
+        await self.translator.close()
+
+    async def contents(self, amount: int):
+        """Async input counting how many texts were read"""
+        for index in range(amount):
+            self.pulled += 1
+            yield str(index)
+
+    async def test_order(self):
+        """Ensure translations keep the input order when ordered, even when a later batch finishes first"""
+        translate_batch = self.provider.translate_batch
+
+        async def first_batch_slow(contents, to, source="", **options):
+            await asyncio.sleep(0.05 if contents[0] == "0" else 0)
+            return await translate_batch(contents, to, source, **options)
+
+        self.provider.translate_batch = first_batch_slow
+        stream = self.translator.translate_stream('de', self.contents(6), self.provider, batch_size=2)
+        self.assertEqual([translation.text async for translation in stream], [str(index) for index in range(6)])
+        stream = self.translator.translate_stream('de', self.contents(6), self.provider, batch_size=2, ordered=False)
+        texts = [translation.text async for translation in stream]
+        self.assertEqual(sorted(texts), [str(index) for index in range(6)])
+        self.assertEqual(texts[-2:], ["0", "1"])
+
+    async def test_read_ahead(self):
+        """Ensure the input is only read concurrency batches ahead of the consumer"""
+        stream = self.translator.translate_stream('de', self.contents(100), self.provider, batch_size=2, concurrency=2)
+        await stream.__anext__()
+        self.assertLessEqual(self.pulled, 2 * 3)
+        await stream.aclose()
+
+    async def test_stop_early(self):
+        """Ensure batches still in flight are cancelled when the consumer stops"""
+        translate_batch = self.provider.translate_batch
+
+        async def later_batches_slow(contents, to, source="", **options):
+            self.provider.delay = 0 if contents[0] == "0" else 10
+            return await translate_batch(contents, to, source, **options)
+
+        self.provider.translate_batch = later_batches_slow
+        stream = self.translator.translate_stream('de', self.contents(100), self.provider, batch_size=2, concurrency=3)
+        await stream.__anext__()
+        await stream.aclose()
+        await asyncio.sleep(0.01)
+        self.assertEqual(self.provider.cancelled, 2)
+        self.assertEqual(len(self.provider.calls), 3)
+
+
+class TrivialContentTests(TestCase):
+    def test_untranslatable(self):
+        """Ensure content without words is recognised as untranslatable"""
+        self.assertTrue(is_untranslatable("😀 <@123> https://example.com 42"))
+        self.assertFalse(is_untranslatable("hi <@123>"))
+
+    def test_mask_restore(self):
+        """Ensure masked spans are put back into the translation"""
+        masked = mask("see https://example.com <@123>")
+        self.assertEqual(masked.text, "see ⟦0⟧ ⟦1⟧")
+        self.assertEqual(masked.restore("mira ⟦0⟧ ⟦1⟧"), "mira https://example.com <@123>")
+
+    def test_mask_shortcodes_only(self):
+        """Ensure emoji shortcodes are masked but times and words between colons aren't"""
+        self.assertEqual(mask("at 10:30:45 hello:world: yes :thumbsup:").text, "at 10:30:45 hello:world: yes ⟦0⟧")
+
+
 if __name__ == '__main__':
     unittest.main()